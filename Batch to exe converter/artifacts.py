@@ -0,0 +1,132 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+
+from assets import hash_file
+
+logger = logging.getLogger(__name__)
+
+# Versión del cálculo de la clave; cambiarla invalida todas las entradas del almacén
+KEY_VERSION = 1
+
+# Tramo que se compara de una vez al verificar dos ejecutables
+COMPARE_CHUNK = 1024 * 1024
+
+
+def canonical_source(text):
+    """Forma canónica del código generado: saltos de línea LF y un único salto final"""
+    return text.replace('\r\n', '\n').replace('\r', '\n').rstrip('\n') + '\n'
+
+
+def build_key(source, compiler, options, inputs=None):
+    """Clave de una compilación reproducible
+
+    Combina el hash del código canónico, la identidad exacta del compilador, las
+    opciones que cambian el ejecutable y el hash del contenido (no la ruta) de los
+    archivos de entrada, de modo que dos máquinas con las mismas entradas obtienen
+    la misma clave.
+    """
+    description = {
+        'version': KEY_VERSION,
+        'source': hashlib.sha256(source.encode('utf-8')).hexdigest(),
+        'compiler': compiler,
+        'options': options,
+        'inputs': inputs or {},
+    }
+    canonical = json.dumps(description, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def first_difference(path_a, path_b):
+    """Desplazamiento del primer byte distinto entre dos archivos, o None si son idénticos"""
+    offset = 0
+    with open(path_a, 'rb') as a, open(path_b, 'rb') as b:
+        while True:
+            chunk_a = a.read(COMPARE_CHUNK)
+            chunk_b = b.read(COMPARE_CHUNK)
+            if chunk_a != chunk_b:
+                for index, (byte_a, byte_b) in enumerate(zip(chunk_a, chunk_b)):
+                    if byte_a != byte_b:
+                        return offset + index
+                return offset + min(len(chunk_a), len(chunk_b))
+            if not chunk_a:
+                return None
+            offset += len(chunk_a)
+
+
+class ArtifactStore:
+    """Almacén compartido de ejecutables indexado por la clave de compilación
+
+    Cada entrada es <clave[:2]>/<clave>.exe con un <clave>.json que guarda su hash.
+    El ejecutable se publica antes que su descripción y ambos se escriben en un
+    temporal que se renombra, así que un agente nunca lee una entrada a medias.
+    Sin publish el almacén solo se lee, como en una carpeta de red de solo lectura.
+    """
+
+    def __init__(self, root, publish=False):
+        self.root = root
+        self.publish_enabled = publish
+
+    def entry_path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _temp_path(self, path):
+        return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    def fetch(self, key, output_path):
+        """Copia el ejecutable de la clave a output_path; devuelve False si no está o no es válido"""
+        entry = self.entry_path(key)
+        try:
+            with open(entry + '.json', 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning("Entrada ilegible en el almacén de artefactos %s: %s", key[:12], e)
+            return False
+
+        temp_path = self._temp_path(output_path)
+        try:
+            shutil.copyfile(entry + '.exe', temp_path)
+            if hash_file(temp_path) != metadata.get('sha256'):
+                logger.warning("Entrada dañada en el almacén de artefactos: %s", key[:12])
+                return False
+            os.replace(temp_path, output_path)
+            return True
+        except OSError as e:
+            logger.warning("No se pudo leer del almacén de artefactos: %s", e)
+            return False
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def publish(self, key, path, **metadata):
+        """Añade un ejecutable al almacén si está permitido y aún no existe"""
+        if not self.publish_enabled:
+            return False
+        entry = self.entry_path(key)
+        if os.path.exists(entry + '.json'):
+            return False
+
+        metadata = dict(metadata, key=key, sha256=hash_file(path), size=os.path.getsize(path))
+        temp_exe = self._temp_path(entry + '.exe')
+        temp_json = self._temp_path(entry + '.json')
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            shutil.copyfile(path, temp_exe)
+            with open(temp_json, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, ensure_ascii=False, sort_keys=True)
+            os.replace(temp_exe, entry + '.exe')
+            os.replace(temp_json, entry + '.json')
+            return True
+        except OSError as e:
+            # Un almacén de solo lectura o lleno nunca debe hacer fallar la compilación
+            logger.warning("No se pudo publicar en el almacén de artefactos: %s", e)
+            return False
+        finally:
+            for temp_path in (temp_exe, temp_json):
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
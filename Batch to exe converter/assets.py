@@ -0,0 +1,182 @@
+import os
+import zlib
+import shutil
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from paths import user_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Prefijo del recurso con el que se embebe cada contenido único en el ensamblado
+RESOURCE_PREFIX = 'asset.'
+
+# Tamaño de bloque para calcular hashes y comprimir sin cargar el archivo entero
+CHUNK_SIZE = 1024 * 1024
+
+# Los archivos que no se reducen al menos este porcentaje se embeben sin comprimir
+MIN_COMPRESSION_GAIN = 0.05
+
+
+class AssetError(ValueError):
+    """Un archivo adicional no es válido o no se puede empaquetar"""
+
+
+class AssetEntry:
+    """Un archivo adicional con el contenido ya empaquetado"""
+
+    def __init__(self, name, path, sha256, size, blob_path, compressed):
+        self.name = name
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.blob_path = blob_path
+        self.compressed = compressed
+
+    @property
+    def resource_name(self):
+        # Los archivos con el mismo contenido comparten un único recurso
+        return RESOURCE_PREFIX + self.sha256
+
+    @property
+    def packed_size(self):
+        return os.path.getsize(self.blob_path)
+
+
+class AssetBundle:
+    """Conjunto de archivos adicionales que se embeben en el ejecutable"""
+
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda entry: entry.name.lower())
+        index = '\n'.join(f'{entry.name}\t{entry.sha256}' for entry in self.entries)
+        self.hash = hashlib.sha256(index.encode('utf-8')).hexdigest()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def resources(self):
+        """Argumentos /resource: del compilador, uno por contenido único"""
+        unique = {}
+        for entry in self.entries:
+            unique.setdefault(entry.resource_name, entry.blob_path)
+        return [f'{blob_path},{name}' for name, blob_path in sorted(unique.items())]
+
+    def referenced_by(self, data):
+        """Nombres de los archivos que aparecen en el texto del script"""
+        text = data.decode('latin-1').lower()
+        referenced = set()
+        for entry in self.entries:
+            name = entry.name.lower()
+            if name in text or os.path.basename(name.replace('\\', os.sep)) in text:
+                referenced.add(entry.name)
+        return referenced
+
+
+def collect_assets(paths):
+    """Expande archivos y carpetas en una lista de (nombre relativo, ruta)"""
+    collected = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            # Las carpetas conservan su nombre como prefijo de sus archivos
+            base = os.path.dirname(path.rstrip('\\/'))
+            for root, _, files in os.walk(path):
+                for file_name in sorted(files):
+                    file_path = os.path.join(root, file_name)
+                    collected.append((os.path.relpath(file_path, base), file_path))
+        elif os.path.isfile(path):
+            collected.append((os.path.basename(path), path))
+        else:
+            raise AssetError(f"No se encuentra el archivo adicional: {path}")
+
+    seen = {}
+    result = []
+    for name, path in collected:
+        name = name.replace('/', '\\')
+        if name.startswith('..') or ':' in name:
+            raise AssetError(f"Nombre de archivo adicional no válido: {name}")
+        if name.lower() in seen:
+            raise AssetError(f"Archivo adicional duplicado: {name} ({seen[name.lower()]} y {path})")
+        seen[name.lower()] = path
+        result.append((name, path))
+    return result
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pack_file(path, sha256):
+    """Comprime el contenido en DEFLATE sin cabecera (el formato de DeflateStream)
+
+    El resultado se guarda en la caché por usuario indexado por el hash del contenido,
+    de modo que cada contenido se comprime una sola vez. Devuelve la ruta del bloque
+    y si está comprimido.
+    """
+    cache_dir = user_data_dir('assets')
+    for suffix, compressed in (('.deflate', True), ('.raw', False)):
+        blob_path = os.path.join(cache_dir, sha256 + suffix)
+        if os.path.exists(blob_path):
+            return blob_path, compressed
+
+    temp_path = os.path.join(cache_dir, f'{sha256}.{os.getpid()}.{threading.get_ident()}.tmp')
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    size = 0
+    with open(path, 'rb') as source, open(temp_path, 'wb') as target:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            size += len(chunk)
+            target.write(compressor.compress(chunk))
+        target.write(compressor.flush())
+    packed_size = os.path.getsize(temp_path)
+
+    if packed_size > size * (1 - MIN_COMPRESSION_GAIN):
+        # El contenido ya estaba comprimido: se embebe tal cual
+        shutil.copyfile(path, temp_path)
+        blob_path = os.path.join(cache_dir, sha256 + '.raw')
+        compressed = False
+    else:
+        blob_path = os.path.join(cache_dir, sha256 + '.deflate')
+        compressed = True
+    os.replace(temp_path, blob_path)
+
+    logger.debug("Archivo adicional empaquetado: %s (%d -> %d bytes)", path, size, os.path.getsize(blob_path))
+    return blob_path, compressed
+
+
+def build_bundle(paths, max_workers=None):
+    """Empaqueta los archivos adicionales, comprimiendo en paralelo cada contenido distinto"""
+    collected = collect_assets(paths)
+    if not collected:
+        return AssetBundle([])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        hashes = list(executor.map(lambda item: hash_file(item[1]), collected))
+
+        # Un mismo contenido se comprime una única vez aunque aparezca con varios nombres
+        first_paths = {}
+        for (_, path), sha256 in zip(collected, hashes):
+            first_paths.setdefault(sha256, path)
+        packed = dict(zip(
+            first_paths,
+            executor.map(lambda item: pack_file(item[1], item[0]), first_paths.items())
+        ))
+
+    entries = []
+    for (name, path), sha256 in zip(collected, hashes):
+        blob_path, compressed = packed[sha256]
+        entries.append(AssetEntry(name, path, sha256, os.path.getsize(path), blob_path, compressed))
+
+    bundle = AssetBundle(entries)
+    logger.info(
+        "Archivos adicionales: %d (%d contenidos distintos), %d -> %d bytes",
+        len(entries), len(packed),
+        sum(entry.size for entry in entries),
+        sum(os.path.getsize(blob_path) for blob_path, _ in packed.values())
+    )
+    return bundle
@@ -0,0 +1,317 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from artifacts import first_difference
+from compilers import PLATFORMS, get_backends
+from converter import ConversionWorker, platform_options
+from journal import STATE_COMPLETED, STATE_FAILED, STATE_STARTED, RunJournal, file_sha256, job_id
+from preflight import BATCH_EXTENSIONS
+from settings import SettingsStore
+
+# Diario que se crea en la carpeta de salida si no se indica otro
+JOURNAL_NAME = '.batch_journal.jsonl'
+
+_print_lock = threading.Lock()
+
+# Identidad de cada compilador calculada una sola vez por ejecución
+_compiler_identities = {}
+_identity_lock = threading.Lock()
+
+
+def json_argument(text):
+    """Valor JSON de un argumento de la línea de comandos"""
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"JSON no válido: {e}")
+
+
+def find_scripts(inputs):
+    """Expande archivos y carpetas en una lista de (script, subcarpeta de salida relativa)"""
+    scripts = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file_name in sorted(files):
+                    if file_name.lower().endswith(BATCH_EXTENSIONS):
+                        # Las carpetas de entrada se reflejan en la de salida para evitar colisiones
+                        scripts.append((os.path.join(root, file_name), os.path.relpath(root, path)))
+        else:
+            scripts.append((path, '.'))
+    return scripts
+
+
+def build_jobs(args, preset=None):
+    """Configuración de ConversionWorker para cada script de la ejecución
+
+    Las opciones del preset se usan como valores por defecto; las de la línea de
+    comandos las activan además de las del preset.
+    """
+    preset = preset or {}
+    jobs = []
+    outputs = {}
+    for script, relative_dir in find_scripts(args.inputs):
+        output_dir = os.path.normpath(os.path.join(os.path.abspath(args.output_dir), relative_dir))
+        output_name = os.path.splitext(os.path.basename(script))[0]
+        config = {
+            'batch_file': os.path.abspath(script),
+            'icon_file': os.path.abspath(args.icon) if args.icon else '',
+            'output_dir': output_dir,
+            'output_name': output_name,
+            'console': args.console or preset.get('console', False),
+            'admin_required': args.admin or preset.get('admin_required', False),
+            'compiler': args.compiler or preset.get('compiler', 'auto'),
+            'extraction_cache': args.cache or preset.get('extraction_cache', False),
+            'emit_delta': args.emit_delta or preset.get('emit_delta', False),
+            'deterministic': args.deterministic or args.verify,
+            'artifact_store': os.path.abspath(args.artifact_store) if args.artifact_store else None,
+            'publish_artifacts': args.publish,
+        }
+        if preset:
+            config['center_window'] = preset.get('center_window', False)
+            config['telemetry'] = preset.get('telemetry', False)
+            if preset.get('telemetry_file'):
+                config['telemetry_file'] = preset['telemetry_file']
+        if args.telemetry is not None:
+            config['telemetry'] = True
+            if args.telemetry:
+                config['telemetry_file'] = args.telemetry
+        if args.matrix:
+            config['matrix'] = args.matrix
+        elif args.platform or preset.get('platforms'):
+            config.update(platform_options(args.platform or preset['platforms']))
+        key = os.path.normcase(os.path.join(output_dir, output_name))
+        if key in outputs:
+            raise ValueError(f"Dos scripts generarían el mismo ejecutable: {outputs[key]} y {script}")
+        outputs[key] = script
+        jobs.append(config)
+    return jobs
+
+
+def report(message):
+    with _print_lock:
+        print(message, flush=True)
+
+
+def cleanup_in_flight(entry):
+    """Elimina los restos de un trabajo que quedó a medias: su carpeta de trabajo y salidas parciales"""
+    work_dir = entry.get('work_dir')
+    if work_dir and os.path.isdir(work_dir):
+        shutil.rmtree(work_dir, ignore_errors=True)
+    for output in entry.get('expected_outputs') or []:
+        if os.path.exists(output):
+            os.remove(output)
+
+
+def compiler_identity(name):
+    """Identidad actual del compilador con ese nombre, o None si ya no está disponible"""
+    with _identity_lock:
+        if name not in _compiler_identities:
+            _compiler_identities[name] = next(
+                (backend.identity() for backend in get_backends() if backend.name == name and backend.is_available()),
+                None
+            )
+        return _compiler_identities[name]
+
+
+def job_inputs(config, compiler):
+    """Entradas que cambian el ejecutable sin cambiar la configuración: el contenido del icono y el compilador"""
+    icon_file = config.get('icon_file')
+    return {
+        'icon': file_sha256(icon_file) if icon_file else None,
+        'compiler': compiler_identity(compiler) if compiler else None,
+    }
+
+
+def run_job(config, journal, job, work_root):
+    """Convierte un script registrando en el diario el inicio y el resultado"""
+    input_hash = file_sha256(config['batch_file'])
+    # Con 'auto' el compilador puede variar entre trabajos: se comprueba el que se usó la última vez
+    recorded_compiler = (journal.recorded_inputs(job).get('compiler') or '').split(':')[0]
+    inputs = job_inputs(config, recorded_compiler)
+    if journal.is_done(job, input_hash, inputs):
+        return 'skipped', None
+
+    config = dict(config, work_dir=os.path.join(work_root, job))
+    worker = ConversionWorker(config)
+    journal.record(
+        job, STATE_STARTED,
+        batch_file=config['batch_file'],
+        input_hash=input_hash,
+        work_dir=config['work_dir'],
+        expected_outputs=worker.expected_outputs(),
+    )
+
+    errors = []
+    worker.error.connect(errors.append)
+    worker.run()
+    shutil.rmtree(config['work_dir'], ignore_errors=True)
+
+    if errors or not worker.outputs:
+        error = errors[0] if errors else 'La conversión no generó ningún ejecutable'
+        journal.record(job, STATE_FAILED, error=error)
+        return 'failed', error
+
+    journal.record(
+        job, STATE_COMPLETED,
+        input_hash=input_hash,
+        inputs=dict(inputs, compiler=compiler_identity(worker.backend.name)),
+        outputs={output: file_sha256(output) for output in worker.outputs},
+    )
+    return 'converted', None
+
+
+def verify_job(config, work_root, job):
+    """Recompila un script aparte y compara cada ejecutable byte a byte con el existente"""
+    output_dir = config['output_dir']
+    # La recompilación nunca se sirve del almacén: es lo que se quiere comprobar
+    config = dict(
+        config,
+        output_dir=os.path.join(work_root, job, 'verify'),
+        work_dir=os.path.join(work_root, job),
+        artifact_store=None,
+        record_history=False,
+    )
+    worker = ConversionWorker(config)
+    errors = []
+    worker.error.connect(errors.append)
+    try:
+        worker.run()
+        if errors or not worker.outputs:
+            return 'failed', errors[0] if errors else 'La recompilación no generó ningún ejecutable'
+
+        mismatches = []
+        for rebuilt in worker.outputs:
+            original = os.path.join(output_dir, os.path.basename(rebuilt))
+            if not os.path.exists(original):
+                mismatches.append(f"{os.path.basename(original)} no existe")
+                continue
+            offset = first_difference(original, rebuilt)
+            if offset is not None:
+                mismatches.append(f"{os.path.basename(original)} difiere en el byte 0x{offset:x}")
+        if mismatches:
+            return 'differs', '; '.join(mismatches)
+        return 'identical', None
+    finally:
+        shutil.rmtree(config['work_dir'], ignore_errors=True)
+
+
+def run_verify(jobs, args):
+    """Comprueba que todos los trabajos son reproducibles; devuelve 1 si alguno difiere"""
+    work_root = os.path.join(os.path.abspath(args.output_dir), '.batch_verify')
+    counts = {'identical': 0, 'differs': 0, 'failed': 0}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+        futures = {executor.submit(verify_job, config, work_root, job_id(config)): config for config in jobs}
+        for number, future in enumerate(as_completed(futures), 1):
+            config = futures[future]
+            try:
+                outcome, error = future.result()
+            except Exception as e:
+                outcome, error = 'failed', str(e)
+            counts[outcome] += 1
+            line = f"[{number}/{len(jobs)}] {outcome:<9} {config['batch_file']}"
+            report(f"{line}: {error}" if error else line)
+
+    shutil.rmtree(work_root, ignore_errors=True)
+    report(
+        f"Idénticos: {counts['identical']}  distintos: {counts['differs']}  "
+        f"fallidos: {counts['failed']}  en {time.perf_counter() - started:.1f} s"
+    )
+    return 0 if counts['identical'] == len(jobs) else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Conversión masiva de scripts batch con diario reanudable')
+    parser.add_argument('inputs', nargs='+', help='Scripts .bat/.cmd o carpetas que los contienen')
+    parser.add_argument('-o', '--output-dir', default='dist', help='Carpeta de salida')
+    parser.add_argument('--journal', help=f'Diario de la ejecución (por defecto {JOURNAL_NAME} en la carpeta de salida)')
+    parser.add_argument('--fresh', action='store_true', help='Descarta el diario y convierte todo de nuevo')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Trabajos en paralelo')
+    parser.add_argument('--preset', help='Preset de opciones guardado desde la interfaz gráfica')
+    parser.add_argument('--compiler', help='Compilador a usar (auto, csc, roslyn, mcs)')
+    platform_group = parser.add_mutually_exclusive_group()
+    platform_group.add_argument('--platform', action='append', choices=PLATFORMS,
+                                help='Plataforma de destino; repetida, compila un ejecutable por plataforma')
+    platform_group.add_argument('--matrix', type=json_argument,
+                                help='Matriz de variantes en JSON, p. ej. {"platforms": ["x86", "x64"], "console": [true, false]}')
+    parser.add_argument('--icon', help='Icono (.ico/.png) para todos los ejecutables')
+    parser.add_argument('--console', action='store_true', help='Ejecutables de consola')
+    parser.add_argument('--admin', action='store_true', help='Requerir privilegios de administrador')
+    parser.add_argument('--telemetry', nargs='?', const='', metavar='ARCHIVO',
+                        help='Registrar los tiempos de cada ejecución, opcionalmente en ARCHIVO '
+                             '(admite variables como %%LOCALAPPDATA%%; por defecto telemetry.jsonl del usuario)')
+    parser.add_argument('--cache', action='store_true', help='Reutilizar el script extraído entre ejecuciones')
+    parser.add_argument('--emit-delta', action='store_true',
+                        help='Generar un parche binario desde la versión anterior de cada ejecutable')
+    parser.add_argument('--deterministic', action='store_true',
+                        help='Compilación reproducible: el mismo script genera siempre el mismo ejecutable')
+    parser.add_argument('--artifact-store', help='Almacén compartido de ejecutables reproducibles (implica --deterministic)')
+    parser.add_argument('--publish', action='store_true', help='Publicar en el almacén los ejecutables compilados')
+    parser.add_argument('--verify', action='store_true',
+                        help='Recompilar y comparar byte a byte con los ejecutables existentes, sin modificarlos')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Mostrar el registro detallado de cada conversión')
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    try:
+        # Solo se leen las preferencias: una ejecución desatendida nunca las modifica
+        preset = SettingsStore(read_only=True).preset(args.preset) if args.preset else None
+        jobs = build_jobs(args, preset)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    if args.verify:
+        return run_verify(jobs, args)
+
+    journal_path = args.journal or os.path.join(args.output_dir, JOURNAL_NAME)
+    if args.fresh and os.path.exists(journal_path):
+        os.remove(journal_path)
+    journal = RunJournal(journal_path)
+    journal.compact()
+    work_root = os.path.join(os.path.dirname(os.path.abspath(journal_path)), '.batch_work')
+
+    # Limpiar lo que dejaron a medias los trabajos interrumpidos en la ejecución anterior
+    in_flight = journal.in_flight()
+    for entry in in_flight.values():
+        cleanup_in_flight(entry)
+    if in_flight:
+        report(f"Reanudando: {len(in_flight)} trabajos interrumpidos se repetirán")
+
+    counts = {'converted': 0, 'skipped': 0, 'failed': 0}
+    started = time.perf_counter()
+    with journal:
+        with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+            futures = {executor.submit(run_job, config, journal, job_id(config), work_root): config for config in jobs}
+            for number, future in enumerate(as_completed(futures), 1):
+                config = futures[future]
+                try:
+                    outcome, error = future.result()
+                except Exception as e:
+                    outcome, error = 'failed', str(e)
+                    journal.record(job_id(config), STATE_FAILED, error=error)
+                counts[outcome] += 1
+                line = f"[{number}/{len(jobs)}] {outcome:<9} {config['batch_file']}"
+                report(f"{line}: {error}" if error else line)
+
+    shutil.rmtree(work_root, ignore_errors=True)
+    report(
+        f"Convertidos: {counts['converted']}  omitidos: {counts['skipped']}  "
+        f"fallidos: {counts['failed']}  en {time.perf_counter() - started:.1f} s"
+    )
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,29 @@
 import sys
+import json
+import hashlib
 import time
 import os
 import subprocess
 import tempfile
 import shutil
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from PyQt6.QtCore import QThread, pyqtSignal
 import logging
 from datetime import datetime
+from contextlib import contextmanager
+from types import SimpleNamespace
+from payload import DEFAULT_CODEPAGE, cs_literal_lines, prepare_payload
+from icons import DEFAULT_SIZES, IconError, prepare_icon
+from compilers import (CAP_DETERMINISTIC, CAP_ICON, CAP_MANIFEST, CAP_PLATFORM, CAP_RESOURCES, PLATFORMS,
+                       CompilationCancelled, CompilerStats, run_compiler, select_backend)
+from preflight import check_payload_size, check_preflight, normalize_axes, normalize_variant
+from history import HistoryStore
+from pe_resources import build_manifest, normalize_executable
+from assets import build_bundle, hash_file
+from artifacts import ArtifactStore, build_key, canonical_source
+from delta import create_delta
 
 # Configuración del sistema de logging
 def setup_logging(level=logging.INFO):
@@ -30,6 +47,15 @@ def setup_logging(level=logging.INFO):
 # Crear el logger
 logger = setup_logging()
 
+
+def platform_options(platforms):
+    """Opciones de configuración para compilar una plataforma o una variante por plataforma"""
+    platforms = list(dict.fromkeys(platforms))
+    if len(platforms) == 1:
+        return {'platform': platforms[0]}
+    return {'matrix': {'platforms': platforms}}
+
+
 class ConversionWorker(QThread):
     progress = pyqtSignal(int)
     status = pyqtSignal(str)
@@ -42,6 +68,26 @@ class ConversionWorker(QThread):
         self.require_admin = config.get('require_admin', True)
         self.process = None
         self.temp_files = []
+        self.backend = None
+        self.outputs = []
+        self._lock = threading.Lock()
+        self._payload_literal = None
+        self.icon_file = None
+        self.icon_cache_hit = False
+        self._icon_prepared = False
+        self.payload = None
+        self.assets = None
+        self.deltas = []
+        self.stage_timings = []
+        self._cancel_event = threading.Event()
+        self.compiler_stats = CompilerStats()
+        # Con un almacén de artefactos compartido la compilación es siempre reproducible
+        self.artifact_store = None
+        if config.get('artifact_store'):
+            self.artifact_store = ArtifactStore(config['artifact_store'], publish=config.get('publish_artifacts', False))
+        self.deterministic = bool(config.get('deterministic', False) or self.artifact_store)
+        self.artifact_hits = 0
+        self._input_hashes = {}
         logger.debug("ConversionWorker inicializado con config: %s", self.config)
 
     def cleanup_temp_files(self):
@@ -61,25 +107,55 @@ class ConversionWorker(QThread):
         else:
             logger.debug("No se eliminarán los archivos temporales")
 
-    def generate_cs_template(self, bat_content):
+    def get_payload_literal(self, payload):
+        """Convierte los bytes del script en un literal de C#, un fragmento por línea"""
+        # Se calcula una sola vez por script aunque se generen varias variantes
+        with self._lock:
+            if self._payload_literal is None or self._payload_literal[0] != payload.sha256:
+                self._payload_literal = (payload.sha256, ' +\n'.join(cs_literal_lines(payload.data)))
+            return self._payload_literal[1]
+
+    def generate_cs_template(self, payload, admin_required=None, console=None):
         """Genera el template de C# para la conversión"""
         logger.debug("Generando template C#")
+        if admin_required is None:
+            admin_required = self.config.get('admin_required', False)
+        if console is None:
+            console = self.config.get('console', False)
 
         try:
-            # Escapar el contenido del batch para C#
-            escaped_bat_content = (
-                bat_content
-                .replace("\\", "\\\\")
-                .replace("\"", "\\\"")
-                .replace("\r\n", "\\r\\n")
-                .replace("\n", "\\r\\n")
-                .replace("\t", "\\t")
-                .replace("$", "$$")
-            )
+            payload_literal = self.get_payload_literal(payload)
+
+            # En la variante de consola el script se ejecuta en la consola del propio ejecutable
+            use_shell_execute = 'false' if console else 'true'
+
+            # Caché de extracción persistente por usuario, indexada por el hash del script
+            use_cache = 'true' if self.config.get('extraction_cache', False) else 'false'
+            cache_max_age_days = int(self.config.get('cache_max_age_days', 30))
 
             # Verificar que el contenido escapado sea válido
             logger.debug("Generando template con contenido escapado")
 
+            # Puntos de medición de la telemetría; sin telemetría no se genera ningún código
+            tm = self.telemetry_snippets()
+
+            # Con archivos adicionales el script se escribe en su carpeta para que %~dp0 los encuentre
+            assets_code = self.generate_assets_code(payload)
+            if assets_code:
+                temp_directory = 'BatchAssets.AssetDirectory'
+                cache_directory = 'BatchAssets.AssetDirectory'
+                assets_arguments = '''if (args.Length == 2 && args[0] == "--extract-asset")
+                    {
+                        Environment.Exit(BatchAssets.ExtractByName(args[1]) ? 0 : 1);
+                        return;
+                    }'''
+                assets_prepare = f'{tm.begin_assets}BatchAssets.Prepare();{tm.end_assets}'
+                assets_cleanup = 'BatchAssets.EvictStaleBundles(config.CacheMaxAgeDays);'
+            else:
+                temp_directory = 'Path.GetTempPath()'
+                cache_directory = 'GetCacheDirectory()'
+                assets_arguments = assets_prepare = assets_cleanup = ''
+
             # Solo incluir la clase RequireAdministrator si se requieren privilegios de administrador
             admin_check_class = '''
         [System.Security.Permissions.PermissionSet(System.Security.Permissions.SecurityAction.Demand, Name="FullTrust")]
@@ -101,7 +177,54 @@ class ConversionWorker(QThread):
                     return false;
                 }
             }
-        }''' if self.config.get('admin_required', False) else ''
+        }''' if admin_required else ''
+
+            # En la consola compartida el "chcp 65001" del script seguiría activo al salir:
+            # se guardan las páginas de códigos antes de lanzarlo y se restauran después
+            if console and payload.prelude_lines:
+                codepage_class = '''
+        public static class ConsoleCodePage
+        {
+            [System.Runtime.InteropServices.DllImport("kernel32.dll")]
+            private static extern uint GetConsoleCP();
+
+            [System.Runtime.InteropServices.DllImport("kernel32.dll")]
+            private static extern uint GetConsoleOutputCP();
+
+            [System.Runtime.InteropServices.DllImport("kernel32.dll")]
+            private static extern bool SetConsoleCP(uint codePage);
+
+            [System.Runtime.InteropServices.DllImport("kernel32.dll")]
+            private static extern bool SetConsoleOutputCP(uint codePage);
+
+            public static uint[] Save()
+            {
+                return new uint[] { GetConsoleCP(), GetConsoleOutputCP() };
+            }
+
+            public static void Restore(uint[] saved)
+            {
+                // 0 indica que el proceso no tenía consola
+                if (saved[0] != 0)
+                {
+                    SetConsoleCP(saved[0]);
+                }
+                if (saved[1] != 0)
+                {
+                    SetConsoleOutputCP(saved[1]);
+                }
+            }
+        }'''
+                codepage_save = 'uint[] savedCodePages = ConsoleCodePage.Save();'
+                codepage_restore = 'ConsoleCodePage.Restore(savedCodePages);'
+            else:
+                codepage_class = codepage_save = codepage_restore = ''
+
+            # Identidad fija del ensamblado en las compilaciones reproducibles
+            assembly_attributes = '''
+    [assembly: System.Reflection.AssemblyVersion("1.0.0.0")]
+    [assembly: System.Reflection.AssemblyFileVersion("1.0.0.0")]
+    [assembly: System.Reflection.AssemblyProduct("BatchExecutor")]''' if self.deterministic else ''
 
             template = f'''
     using System;
@@ -111,6 +234,7 @@ class ConversionWorker(QThread):
     using System.Windows.Forms;
     using System.Threading;
     using System.Threading.Tasks;
+{assembly_attributes}
 
     namespace BatchExecutor
     {{
@@ -118,7 +242,12 @@ class ConversionWorker(QThread):
         {{
             private string _batFilePrefix = "batch_";
             private int _deleteDelayMs = 1000;
-            private string _batchContent = "{escaped_bat_content}";
+            private bool _useCache = {use_cache};
+            private int _cacheMaxAgeDays = {cache_max_age_days};
+            private const string PayloadHash = "{payload.sha256}";
+            // Cada carácter representa un byte del script ya codificado para cmd.exe
+            private const string BatchPayload =
+{payload_literal};
 
             public string BatFilePrefix
             {{
@@ -132,29 +261,73 @@ class ConversionWorker(QThread):
                 set {{ _deleteDelayMs = value; }}
             }}
 
-            public string BatchContent
+            public bool UseCache
+            {{
+                get {{ return _useCache; }}
+                set {{ _useCache = value; }}
+            }}
+
+            public int CacheMaxAgeDays
+            {{
+                get {{ return _cacheMaxAgeDays; }}
+                set {{ _cacheMaxAgeDays = value; }}
+            }}
+
+            public string Hash
+            {{
+                get {{ return PayloadHash; }}
+            }}
+
+            public int PayloadLength
+            {{
+                get {{ return BatchPayload.Length; }}
+            }}
+
+            public byte[] GetBatchBytes()
             {{
-                get {{ return _batchContent; }}
-                set {{ _batchContent = value; }}
+                var bytes = new byte[BatchPayload.Length];
+                for (int i = 0; i < bytes.Length; i++)
+                {{
+                    bytes[i] = (byte)BatchPayload[i];
+                }}
+                return bytes;
             }}
         }}
 
         public class BatchExecutor : IDisposable
         {{
-            private readonly string _tempBatFile;
+            private string _tempBatFile;
+            private bool _cached;
+            // Mantiene bloqueada contra escritura la entrada de la caché mientras cmd.exe la ejecuta
+            private FileStream _cacheHandle;
             private readonly BatchExecutorConfig _config;
             private bool _disposed;
 
             public BatchExecutor(BatchExecutorConfig config)
             {{
                 _config = config ?? new BatchExecutorConfig();
-                _tempBatFile = GenerateTempBatPath();
+                _cached = _config.UseCache;
+                _tempBatFile = _cached ? GenerateCachedBatPath() : GenerateTempBatPath();
+            }}
+
+            private static string GetCacheDirectory()
+            {{
+                return Path.Combine(
+                    Environment.GetFolderPath(Environment.SpecialFolder.LocalApplicationData),
+                    "BatchConverter",
+                    "cache"
+                );
+            }}
+
+            private string GenerateCachedBatPath()
+            {{
+                return Path.Combine({cache_directory}, _config.Hash + ".bat");
             }}
 
             private string GenerateTempBatPath()
             {{
                 return Path.Combine(
-                    Path.GetTempPath(),
+                    {temp_directory},
                     string.Format("{{0}}{{1}}.bat", _config.BatFilePrefix, Guid.NewGuid().ToString("N"))
                 );
             }}
@@ -165,7 +338,7 @@ class ConversionWorker(QThread):
                 {{
                     FileName = "cmd.exe",
                     Arguments = string.Format("/C \\"{{0}}\\"", _tempBatFile),
-                    UseShellExecute = true,
+                    UseShellExecute = {use_shell_execute},
                     WorkingDirectory = Application.StartupPath,
                     WindowStyle = ProcessWindowStyle.Normal,
                     CreateNoWindow = false
@@ -181,6 +354,7 @@ class ConversionWorker(QThread):
                 }}
                 catch (Exception ex)
                 {{
+                    {tm.error}
                     MessageBox.Show(
                         string.Format("Error ejecutando el archivo batch:\\n{{0}}", ex.Message),
                         "Error",
@@ -200,28 +374,17 @@ class ConversionWorker(QThread):
                 ValidateNotDisposed();
                 try
                 {{
-                    Encoding encoding;
-                    try
+                    if (_cached)
                     {{
-                        encoding = Encoding.GetEncoding("IBM437");
-                    }}
-                    catch
-                    {{
-                        try
+                        if (PrepareCachedFile())
                         {{
-                            encoding = Encoding.GetEncoding("Windows-1252");
-                        }}
-                        catch
-                        {{
-                            encoding = Encoding.Default;
+                            return;
                         }}
+                        // Si la caché no se puede usar se vuelve al archivo temporal
+                        _cached = false;
+                        _tempBatFile = GenerateTempBatPath();
                     }}
-
-                    using (var writer = new StreamWriter(_tempBatFile, false, encoding))
-                    {{
-                        writer.Write(_config.BatchContent);
-                        writer.Flush();
-                    }}
+                    WriteBatchBytes(_tempBatFile);
                 }}
                 catch (Exception ex)
                 {{
@@ -235,21 +398,218 @@ class ConversionWorker(QThread):
                 }}
             }}
 
+            private void WriteBatchBytes(string path)
+            {{
+                // Los bytes ya vienen codificados desde la conversión: se escriben tal cual
+                {tm.begin_unpack}
+                var bytes = _config.GetBatchBytes();
+                {tm.end_unpack}
+                {tm.begin_write}
+                using (var stream = new FileStream(path, FileMode.Create, FileAccess.Write, FileShare.None))
+                {{
+                    stream.Write(bytes, 0, bytes.Length);
+                }}
+                {tm.end_write}
+            }}
+
+            private bool PrepareCachedFile()
+            {{
+                string partialFile = null;
+                try
+                {{
+                    Directory.CreateDirectory(Path.GetDirectoryName(_tempBatFile));
+
+                    // La carpeta de la caché la puede modificar cualquier proceso del usuario:
+                    // la entrada solo se usa si su contenido coincide con el hash del script
+                    var info = new FileInfo(_tempBatFile);
+                    if (info.Exists)
+                    {{
+                        TouchCachedFile();
+                        if (LockAndVerifyCachedFile())
+                        {{
+                            {tm.cache_hit}
+                            return true;
+                        }}
+                    }}
+
+                    // Escribir en un archivo propio y publicarlo con un renombrado atómico
+                    partialFile = string.Format("{{0}}.{{1}}.tmp", _tempBatFile, Guid.NewGuid().ToString("N"));
+                    WriteBatchBytes(partialFile);
+                    if (info.Exists)
+                    {{
+                        File.Delete(_tempBatFile);
+                    }}
+                    try
+                    {{
+                        File.Move(partialFile, _tempBatFile);
+                        partialFile = null;
+                    }}
+                    catch (IOException)
+                    {{
+                        // Otro proceso publicó la entrada a la vez: se usa la suya si es válida
+                    }}
+                    // Entre el renombrado y la ejecución el archivo podría cambiar: se bloquea y se verifica
+                    return LockAndVerifyCachedFile();
+                }}
+                catch (Exception)
+                {{
+                    return false;
+                }}
+                finally
+                {{
+                    if (partialFile != null)
+                    {{
+                        TryDeleteFile(partialFile);
+                    }}
+                }}
+            }}
+
+            private bool LockAndVerifyCachedFile()
+            {{
+                FileStream stream = null;
+                try
+                {{
+                    // FileShare.Read impide que otro proceso escriba, renombre o borre el archivo
+                    stream = new FileStream(_tempBatFile, FileMode.Open, FileAccess.Read, FileShare.Read);
+                    if (stream.Length == _config.PayloadLength)
+                    {{
+                        string hash;
+                        using (var sha = System.Security.Cryptography.SHA256.Create())
+                        {{
+                            hash = BitConverter.ToString(sha.ComputeHash(stream)).Replace("-", "").ToLowerInvariant();
+                        }}
+                        if (hash == _config.Hash)
+                        {{
+                            _cacheHandle = stream;
+                            return true;
+                        }}
+                    }}
+                }}
+                catch (IOException)
+                {{
+                }}
+                catch (UnauthorizedAccessException)
+                {{
+                }}
+                if (stream != null)
+                {{
+                    stream.Dispose();
+                }}
+                return false;
+            }}
+
+            private void ReleaseCachedFile()
+            {{
+                if (_cacheHandle != null)
+                {{
+                    _cacheHandle.Dispose();
+                    _cacheHandle = null;
+                }}
+            }}
+
+            private void TouchCachedFile()
+            {{
+                try
+                {{
+                    // La fecha de modificación marca el último uso para la limpieza de entradas antiguas
+                    File.SetLastWriteTimeUtc(_tempBatFile, DateTime.UtcNow);
+                }}
+                catch (Exception)
+                {{
+                    // Otro proceso puede tener el archivo abierto; no es un error
+                }}
+            }}
+
+            private void EvictStaleEntries()
+            {{
+                try
+                {{
+                    string cacheDirectory = GetCacheDirectory();
+                    string marker = Path.Combine(cacheDirectory, ".last_eviction");
+
+                    // Revisar la caché como mucho una vez al día
+                    if (File.Exists(marker) && File.GetLastWriteTimeUtc(marker) > DateTime.UtcNow.AddDays(-1))
+                    {{
+                        return;
+                    }}
+                    File.WriteAllText(marker, string.Empty);
+
+                    DateTime staleLimit = DateTime.UtcNow.AddDays(-_config.CacheMaxAgeDays);
+                    foreach (string entry in Directory.GetFiles(cacheDirectory, "*.bat"))
+                    {{
+                        if (!string.Equals(entry, _tempBatFile, StringComparison.OrdinalIgnoreCase) &&
+                            File.GetLastWriteTimeUtc(entry) < staleLimit)
+                        {{
+                            TryDeleteFile(entry);
+                        }}
+                    }}
+
+                    // Restos de escrituras interrumpidas
+                    DateTime partialLimit = DateTime.UtcNow.AddHours(-1);
+                    foreach (string entry in Directory.GetFiles(cacheDirectory, "*.tmp"))
+                    {{
+                        if (File.GetLastWriteTimeUtc(entry) < partialLimit)
+                        {{
+                            TryDeleteFile(entry);
+                        }}
+                    }}
+                }}
+                catch (Exception)
+                {{
+                    // La limpieza de la caché nunca debe impedir la ejecución
+                }}
+            }}
+
+            private static void TryDeleteFile(string path)
+            {{
+                try
+                {{
+                    File.Delete(path);
+                }}
+                catch (Exception)
+                {{
+                    // Ignorar archivos en uso
+                }}
+            }}
+
             private void ExecuteProcess()
             {{
                 ValidateNotDisposed();
+                {codepage_save}
+                {tm.begin_start}
                 using (var process = Process.Start(CreateStartInfo()))
                 {{
+                    {tm.end_start}
                     if (process == null)
                     {{
                         throw new InvalidOperationException("No se pudo iniciar el proceso");
                     }}
+                    {tm.begin_script}
                     process.WaitForExit();
+                    {codepage_restore}
+                    {tm.end_script}
+                    {tm.exit_code}
                 }}
             }}
 
             private void CleanupTempFile()
             {{
+                {tm.begin_cleanup}
+                CleanupTempFileCore();
+                {tm.end_cleanup}
+            }}
+
+            private void CleanupTempFileCore()
+            {{
+                // cmd.exe ya ha terminado: se libera el bloqueo de la entrada de la caché
+                ReleaseCachedFile();
+                if (_cached)
+                {{
+                    // El script extraído se conserva en la caché para los siguientes lanzamientos
+                    EvictStaleEntries();
+                    return;
+                }}
+
                 if (File.Exists(_tempBatFile))
                 {{
                     try
@@ -283,14 +643,19 @@ class ConversionWorker(QThread):
         }}
 
         {admin_check_class}
+        {codepage_class}
+{assets_code}
+{tm.telemetry_class}
 
         public class Program
         {{
             [STAThread]
-            static void Main()
+            static void Main(string[] args)
             {{
                 try
                 {{
+                    {assets_arguments}
+
                     {'''if (!RequireAdministrator.Check())
                     {
                         ProcessStartInfo startInfo = new ProcessStartInfo();
@@ -314,17 +679,19 @@ class ConversionWorker(QThread):
                             );
                             return;
                         }
-                    }''' if self.config.get('admin_required', False) else ''}
+                    }''' if admin_required else ''}
 
                     Application.EnableVisualStyles();
                     Application.SetCompatibleTextRenderingDefault(false);
 
                     var config = new BatchExecutorConfig();
-                    
+                    {assets_prepare}
+
                     using (var executor = new BatchExecutor(config))
                     {{
                         executor.Execute();
                     }}
+                    {assets_cleanup}
                 }}
                 catch (UnauthorizedAccessException ex)
                 {{
@@ -353,6 +720,7 @@ class ConversionWorker(QThread):
                         MessageBoxIcon.Error
                     );
                 }}
+                {tm.flush}
             }}
         }}
     }}'''
@@ -376,8 +744,460 @@ class ConversionWorker(QThread):
             logger.error(f"Error generando el template de C#: {str(e)}")
             raise Exception(f"Error al generar el template de C#: {str(e)}")
 
-    def compile_cs_to_exe(self, cs_file, output_exe):
+    def generate_assets_code(self, payload):
+        """Genera la clase que extrae bajo demanda los archivos adicionales embebidos"""
+        if not self.assets:
+            return ''
+
+        eager = self.assets.referenced_by(payload.data)
+        entries = ',\n'.join(
+            '                new AssetEntry({}, "{}", "{}", {}L, {}, {})'.format(
+                json.dumps(entry.name),
+                entry.resource_name,
+                entry.sha256,
+                entry.size,
+                'true' if entry.compressed else 'false',
+                'true' if entry.name in eager else 'false',
+            )
+            for entry in self.assets.entries
+        )
+        logger.info("Archivos adicionales extraídos al inicio: %d de %d", len(eager), len(self.assets))
+
+        return f"""
+        public class AssetEntry
+        {{
+            public readonly string Name;
+            public readonly string Resource;
+            public readonly string Hash;
+            public readonly long Size;
+            public readonly bool Compressed;
+            public readonly bool Eager;
+
+            public AssetEntry(string name, string resource, string hash, long size, bool compressed, bool eager)
+            {{
+                Name = name;
+                Resource = resource;
+                Hash = hash;
+                Size = size;
+                Compressed = compressed;
+                Eager = eager;
+            }}
+        }}
+
+        public static class BatchAssets
+        {{
+            private const string BundleHash = "{self.assets.hash}";
+            private static readonly AssetEntry[] Entries = new AssetEntry[]
+            {{
+{entries}
+            }};
+
+            // Archivos verificados que se mantienen abiertos mientras dura el proceso
+            private static readonly System.Collections.Generic.List<FileStream> Handles =
+                new System.Collections.Generic.List<FileStream>();
+
+            public static string AssetRoot
+            {{
+                get
+                {{
+                    return Path.Combine(
+                        Environment.GetFolderPath(Environment.SpecialFolder.LocalApplicationData),
+                        "BatchConverter",
+                        "assets"
+                    );
+                }}
+            }}
+
+            public static string AssetDirectory
+            {{
+                get {{ return Path.Combine(AssetRoot, BundleHash); }}
+            }}
+
+            public static void Prepare()
+            {{
+                Directory.CreateDirectory(AssetDirectory);
+
+                // Solo se extraen al inicio los archivos que menciona el script; el resto
+                // se extrae bajo demanda con "%BATCH_EXE%" --extract-asset nombre
+                foreach (var entry in Entries)
+                {{
+                    if (entry.Eager)
+                    {{
+                        Extract(entry);
+                    }}
+                }}
+
+                try
+                {{
+                    // La fecha de la carpeta marca el último uso del paquete
+                    Directory.SetLastWriteTimeUtc(AssetDirectory, DateTime.UtcNow);
+                }}
+                catch (Exception)
+                {{
+                    // No es un error
+                }}
+
+                // La carpeta no se añade al PATH: un archivo suyo podría suplantar un comando
+                // del sistema; el script usa las rutas de %BATCH_ASSETS%
+                Environment.SetEnvironmentVariable("BATCH_ASSETS", AssetDirectory);
+                Environment.SetEnvironmentVariable("BATCH_EXE", Application.ExecutablePath);
+            }}
+
+            public static bool ExtractByName(string name)
+            {{
+                try
+                {{
+                    name = name.Replace('/', '\\\\');
+                    foreach (var entry in Entries)
+                    {{
+                        if (string.Equals(entry.Name, name, StringComparison.OrdinalIgnoreCase))
+                        {{
+                            Extract(entry);
+                            return true;
+                        }}
+                    }}
+                }}
+                catch (Exception)
+                {{
+                    // El código de salida indica el fallo al script
+                }}
+                return false;
+            }}
+
+            private static void Extract(AssetEntry entry)
+            {{
+                string target = Path.Combine(AssetDirectory, entry.Name);
+
+                // La carpeta es escribible por el usuario: solo se reutiliza una copia con el hash esperado
+                var info = new FileInfo(target);
+                if (info.Exists && LockAndVerify(target, entry))
+                {{
+                    return;
+                }}
+
+                Directory.CreateDirectory(Path.GetDirectoryName(target));
+                string partialFile = string.Format("{{0}}.{{1}}.tmp", target, Guid.NewGuid().ToString("N"));
+                try
+                {{
+                    using (Stream resource = System.Reflection.Assembly.GetExecutingAssembly().GetManifestResourceStream(entry.Resource))
+                    {{
+                        if (resource == null)
+                        {{
+                            throw new FileNotFoundException("No se encuentra el recurso embebido", entry.Name);
+                        }}
+                        using (Stream source = entry.Compressed
+                            ? (Stream)new System.IO.Compression.DeflateStream(resource, System.IO.Compression.CompressionMode.Decompress)
+                            : resource)
+                        using (var output = new FileStream(partialFile, FileMode.Create, FileAccess.Write, FileShare.None))
+                        {{
+                            source.CopyTo(output);
+                        }}
+                    }}
+
+                    // Publicar el archivo con un renombrado atómico
+                    if (info.Exists)
+                    {{
+                        File.Delete(target);
+                    }}
+                    try
+                    {{
+                        File.Move(partialFile, target);
+                        partialFile = null;
+                    }}
+                    catch (IOException)
+                    {{
+                        // Otro proceso lo extrajo a la vez: se usa su copia si es válida
+                    }}
+                    if (!LockAndVerify(target, entry))
+                    {{
+                        throw new IOException("El archivo adicional extraído no es válido: " + entry.Name);
+                    }}
+                }}
+                finally
+                {{
+                    if (partialFile != null)
+                    {{
+                        try
+                        {{
+                            File.Delete(partialFile);
+                        }}
+                        catch (Exception)
+                        {{
+                            // Ignorar archivos en uso
+                        }}
+                    }}
+                }}
+            }}
+
+            private static bool LockAndVerify(string target, AssetEntry entry)
+            {{
+                FileStream stream = null;
+                try
+                {{
+                    // FileShare.Read impide que se sustituya el archivo después de comprobarlo
+                    stream = new FileStream(target, FileMode.Open, FileAccess.Read, FileShare.Read);
+                    if (stream.Length == entry.Size)
+                    {{
+                        string hash;
+                        using (var sha = System.Security.Cryptography.SHA256.Create())
+                        {{
+                            hash = BitConverter.ToString(sha.ComputeHash(stream)).Replace("-", "").ToLowerInvariant();
+                        }}
+                        if (hash == entry.Hash)
+                        {{
+                            lock (Handles)
+                            {{
+                                Handles.Add(stream);
+                            }}
+                            return true;
+                        }}
+                    }}
+                }}
+                catch (IOException)
+                {{
+                }}
+                catch (UnauthorizedAccessException)
+                {{
+                }}
+                if (stream != null)
+                {{
+                    stream.Dispose();
+                }}
+                return false;
+            }}
+
+            public static void EvictStaleBundles(int maxAgeDays)
+            {{
+                try
+                {{
+                    string marker = Path.Combine(AssetRoot, ".last_eviction");
+
+                    // Revisar los paquetes como mucho una vez al día
+                    if (File.Exists(marker) && File.GetLastWriteTimeUtc(marker) > DateTime.UtcNow.AddDays(-1))
+                    {{
+                        return;
+                    }}
+                    File.WriteAllText(marker, string.Empty);
+
+                    DateTime staleLimit = DateTime.UtcNow.AddDays(-maxAgeDays);
+                    foreach (string bundle in Directory.GetDirectories(AssetRoot))
+                    {{
+                        if (!string.Equals(Path.GetFileName(bundle), BundleHash, StringComparison.OrdinalIgnoreCase) &&
+                            Directory.GetLastWriteTimeUtc(bundle) < staleLimit)
+                        {{
+                            try
+                            {{
+                                Directory.Delete(bundle, true);
+                            }}
+                            catch (Exception)
+                            {{
+                                // Paquete en uso por otra instancia
+                            }}
+                        }}
+                    }}
+                }}
+                catch (Exception)
+                {{
+                    // La limpieza nunca debe impedir la ejecución
+                }}
+            }}
+        }}"""
+
+    def telemetry_snippets(self):
+        """Fragmentos de C# que miden cada fase del runtime cuando la telemetría está activada"""
+        phases = ('assets', 'unpack', 'write', 'start', 'script', 'cleanup')
+        if not self.config.get('telemetry', False):
+            snippets = {f'{kind}_{phase}': '' for phase in phases for kind in ('begin', 'end')}
+            snippets.update(cache_hit='', exit_code='', error='', flush='', telemetry_class='')
+            return SimpleNamespace(**snippets)
+
+        snippets = {}
+        for phase in phases:
+            snippets[f'begin_{phase}'] = f'long {phase}Ticks = BatchTelemetry.Begin();'
+            snippets[f'end_{phase}'] = f'BatchTelemetry.End("{phase}", {phase}Ticks);'
+        snippets.update(
+            cache_hit='BatchTelemetry.CacheHit = true;',
+            exit_code='BatchTelemetry.ExitCode = process.ExitCode;',
+            error='BatchTelemetry.Error = ex.GetType().Name;',
+            flush='''finally
+                {
+                    BatchTelemetry.Flush();
+                }''',
+        )
+
+        # Por defecto cada ejecución se añade al archivo de telemetría del usuario
+        telemetry_file = self.config.get('telemetry_file') or '%LOCALAPPDATA%\\BatchConverter\\telemetry.jsonl'
+        payload_hash = self.payload.sha256[:16] if self.payload else ''
+        snippets['telemetry_class'] = f"""
+        public static class BatchTelemetry
+        {{
+            private const string TelemetryFile = {json.dumps(telemetry_file)};
+            private static readonly Stopwatch Clock = Stopwatch.StartNew();
+            private static readonly System.Collections.Generic.List<string> Phases = new System.Collections.Generic.List<string>();
+            private static readonly System.Collections.Generic.Dictionary<string, long> Elapsed = new System.Collections.Generic.Dictionary<string, long>();
+
+            public static bool CacheHit;
+            public static int? ExitCode;
+            public static string Error;
+
+            public static long Begin()
+            {{
+                return Clock.ElapsedTicks;
+            }}
+
+            public static void End(string phase, long started)
+            {{
+                long elapsed = Clock.ElapsedTicks - started;
+                long total;
+                if (Elapsed.TryGetValue(phase, out total))
+                {{
+                    Elapsed[phase] = total + elapsed;
+                }}
+                else
+                {{
+                    Phases.Add(phase);
+                    Elapsed[phase] = elapsed;
+                }}
+            }}
+
+            private static string Milliseconds(long ticks)
+            {{
+                return (ticks * 1000.0 / Stopwatch.Frequency).ToString("0.###", System.Globalization.CultureInfo.InvariantCulture);
+            }}
+
+            private static string Quote(string value)
+            {{
+                var builder = new StringBuilder("\\"");
+                foreach (char c in value)
+                {{
+                    if (c == '"' || c == '\\\\')
+                    {{
+                        builder.Append('\\\\').Append(c);
+                    }}
+                    else if (c < ' ' || c > '~')
+                    {{
+                        builder.AppendFormat("\\\\u{{0:x4}}", (int)c);
+                    }}
+                    else
+                    {{
+                        builder.Append(c);
+                    }}
+                }}
+                return builder.Append('"').ToString();
+            }}
+
+            public static void Flush()
+            {{
+                // Sin fases medidas (p. ej. al relanzarse como administrador) no hay nada que guardar
+                if (Phases.Count == 0)
+                {{
+                    return;
+                }}
+
+                try
+                {{
+                    var line = new StringBuilder();
+                    line.Append("{{\\"ts\\":").Append(Quote(DateTime.UtcNow.ToString("o")));
+                    line.Append(",\\"tool\\":").Append(Quote(Path.GetFileNameWithoutExtension(Application.ExecutablePath)));
+                    line.Append(",\\"hash\\":\\"{payload_hash}\\"");
+                    line.Append(",\\"cached\\":").Append(CacheHit ? "true" : "false");
+                    line.Append(",\\"exit\\":").Append(ExitCode.HasValue ? ExitCode.Value.ToString() : "null");
+                    if (Error != null)
+                    {{
+                        line.Append(",\\"error\\":").Append(Quote(Error));
+                    }}
+                    line.Append(",\\"ms\\":{{");
+                    for (int i = 0; i < Phases.Count; i++)
+                    {{
+                        line.Append(i == 0 ? "" : ",").Append(Quote(Phases[i])).Append(':').Append(Milliseconds(Elapsed[Phases[i]]));
+                    }}
+                    line.Append("}},\\"total\\":").Append(Milliseconds(Clock.ElapsedTicks)).Append("}}\\n");
+
+                    string path = Environment.ExpandEnvironmentVariables(TelemetryFile);
+                    if (!Path.IsPathRooted(path))
+                    {{
+                        path = Path.Combine(Application.StartupPath, path);
+                    }}
+                    Directory.CreateDirectory(Path.GetDirectoryName(path));
+
+                    // Una única escritura en modo anexar para que varias instancias no mezclen líneas
+                    byte[] bytes = Encoding.UTF8.GetBytes(line.ToString());
+                    for (int attempt = 0; attempt < 3; attempt++)
+                    {{
+                        try
+                        {{
+                            using (var stream = new FileStream(path, FileMode.Append, FileAccess.Write, FileShare.ReadWrite))
+                            {{
+                                stream.Write(bytes, 0, bytes.Length);
+                            }}
+                            return;
+                        }}
+                        catch (IOException)
+                        {{
+                            Thread.Sleep(10);
+                        }}
+                    }}
+                }}
+                catch (Exception)
+                {{
+                    // La telemetría nunca debe afectar a la ejecución
+                }}
+            }}
+        }}"""
+        return SimpleNamespace(**snippets)
+
+    def get_manifest_file(self, directory):
+        """Escribe (una sola vez) el manifiesto que exige privilegios de administrador"""
+        with self._lock:
+            manifest_file = os.path.join(directory, "app.manifest")
+            if manifest_file in self.temp_files:
+                return manifest_file
+
+            manifest_content = build_manifest('requireAdministrator')
+
+            with open(manifest_file, 'w', encoding='utf-8') as f:
+                f.write(manifest_content)
+            self.temp_files.append(manifest_file)
+            return manifest_file
+
+    def get_icon_file(self):
+        """Devuelve el icono optimizado (ICO) para compilar; se prepara una sola vez por trabajo"""
+        with self._lock:
+            if self._icon_prepared:
+                return self.icon_file
+            self._icon_prepared = True
+
+            icon_file = self.config.get('icon_file')
+            if not icon_file or not os.path.exists(icon_file):
+                return None
+
+            if not self.config.get('optimize_icon', True):
+                self.icon_file = icon_file
+                return self.icon_file
+
+            try:
+                self.icon_file, self.icon_cache_hit = prepare_icon(
+                    icon_file,
+                    self.config.get('icon_sizes', DEFAULT_SIZES)
+                )
+                logger.info("Icono preparado: %s (caché: %s)", self.icon_file, 'sí' if self.icon_cache_hit else 'no')
+            except IconError as e:
+                if not icon_file.lower().endswith('.ico'):
+                    raise Exception(f"Icono no válido: {e}")
+                logger.warning("No se pudo optimizar el icono, se usa el original: %s", e)
+                self.icon_file = icon_file
+            return self.icon_file
+
+    def compile_cs_to_exe(self, cs_file, output_exe, platform='anycpu', console=None, admin_required=None):
         """Compila el archivo C# a ejecutable"""
+        if console is None:
+            console = self.config.get('console', False)
+        if admin_required is None:
+            admin_required = self.config.get('admin_required', False)
+
+        if self._cancel_event.is_set():
+            raise CompilationCancelled("Compilación cancelada por un error en otra variante")
+
         try:
             # Asegurar que el directorio de salida existe
             output_dir = os.path.dirname(output_exe)
@@ -393,216 +1213,480 @@ class ConversionWorker(QThread):
                 if not content.strip():
                     raise ValueError("El archivo fuente está vacío")
 
-            # Buscar el compilador de C#
-            framework_paths = [
-                r"C:\Windows\Microsoft.NET\Framework64\v4.0.30319",
-                r"C:\Windows\Microsoft.NET\Framework\v4.0.30319",
-            ]
-
-            csc_path = None
-            for base_path in framework_paths:
-                possible_csc = os.path.join(base_path, "csc.exe")
-                if os.path.exists(possible_csc):
-                    csc_path = possible_csc
-                    break
+            # Seleccionar el compilador de C#
+            if self.backend is None and not self.check_csc_compiler():
+                raise FileNotFoundError("No se encontró ningún compilador de C#")
+            backend = self.backend
 
-            if not csc_path:
-                raise FileNotFoundError("No se encontró el compilador de C# (csc.exe)")
-
-            logger.info(f"Usando compilador: {csc_path}")
+            logger.info(f"Usando compilador: {backend.name} ({' '.join(backend.executable())})")
 
             # Solo crear el archivo de manifiesto si se requieren privilegios de administrador
             manifest_file = None
-            if self.config.get('admin_required', False):
-                manifest_content = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
-    <assembly xmlns="urn:schemas-microsoft-com:asm.v1" manifestVersion="1.0">
-        <assemblyIdentity version="1.0.0.0" name="MyApplication.app"/>
-        <trustInfo xmlns="urn:schemas-microsoft-com:asm.v2">
-            <security>
-                <requestedPrivileges xmlns="urn:schemas-microsoft-com:asm.v3">
-                    <requestedExecutionLevel level="requireAdministrator" uiAccess="false"/>
-                </requestedPrivileges>
-            </security>
-        </trustInfo>
-    </assembly>'''
-
-                manifest_file = os.path.join(os.path.dirname(cs_file), "app.manifest")
-                with open(manifest_file, 'w', encoding='utf-8') as f:
-                    f.write(manifest_content)
-                self.temp_files.append(manifest_file)
-
-            # Construir el comando de compilación
-            command = [
-                csc_path,
-                '/nologo',
-                '/target:winexe',
-                '/platform:anycpu',
-                '/optimize+',
-                '/debug-',
-                '/reference:System.dll',
-                '/reference:System.Windows.Forms.dll',
-                '/reference:System.Drawing.dll',
-                '/reference:System.Core.dll',
-            ]
-
-            # Agregar el manifiesto solo si existe
-            if manifest_file:
-                command.append(f'/win32manifest:{manifest_file}')
-
-            # Agregar el resto de los parámetros
-            command.extend([
-                f'/out:{output_exe}',
-                cs_file
-            ])
+            if admin_required:
+                manifest_file = self.get_manifest_file(os.path.dirname(cs_file))
 
             # Agregar icono si existe
-            if self.config.get('icon_file') and os.path.exists(self.config['icon_file']):
-                command.append(f'/win32icon:{self.config["icon_file"]}')
+            icon_file = self.get_icon_file()
+            target = 'exe' if console else 'winexe'
+
+            # Un ejecutable reproducible ya compilado en otra máquina se reutiliza tal cual
+            key = None
+            if self.deterministic:
+                key = self.compute_build_key(backend, content, output_exe, target, platform, manifest_file, icon_file)
+                logger.info("Clave de compilación reproducible: %s", key)
+                if self.artifact_store is not None:
+                    fetch_start = time.perf_counter()
+                    if self.artifact_store.fetch(key, output_exe):
+                        with self._lock:
+                            self.artifact_hits += 1
+                            self.stage_timings.append(('artifact', (time.perf_counter() - fetch_start) * 1000))
+                        logger.info("Ejecutable obtenido del almacén de artefactos: %s", os.path.basename(output_exe))
+                        return True
 
-            # Ejecutar el proceso de compilación
+            # Construir el comando de compilación
+            command = backend.build_command(
+                cs_file,
+                output_exe,
+                target=target,
+                platform=platform,
+                manifest=manifest_file,
+                icon=icon_file,
+                resources=self.assets.resources() if self.assets else (),
+                deterministic=self.deterministic,
+            )
+
+            # Ejecutar el compilador leyendo su salida a medida que se produce
             logger.debug(f"Ejecutando comando: {' '.join(command)}")
-            
-            # Crear el proceso con un shell explícito
-            process = subprocess.Popen(
+            start_time = time.perf_counter()
+            result = run_compiler(
                 command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                env={
-                    "PATH": os.environ["PATH"],
-                    "SystemRoot": os.environ["SystemRoot"],
-                    "TEMP": os.environ["TEMP"],
-                    "TMP": os.environ["TMP"]
-                }
+                env=backend.environment(),
+                timeout=self.config.get('compile_timeout', 30),
+                stop_on_error=self.config.get('stop_on_first_error', True),
+                cancel_event=self._cancel_event,
             )
 
-            # Obtener la salida con timeout
-            try:
-                stdout, stderr = process.communicate(timeout=30)
-                
-                # Registrar la salida para debugging
-                logger.debug(f"Salida estándar: {stdout}")
-                logger.debug(f"Salida de error: {stderr}")
-
-                if process.returncode != 0:
-                    error_msg = stderr.strip() if stderr else stdout.strip()
-                    if not error_msg:
-                        error_msg = f"Error de compilación con código {process.returncode}"
-                    raise Exception(f"Error en la compilación: {error_msg}")
-
-                # Verificar que el archivo se creó
-                if not os.path.exists(output_exe):
-                    raise FileNotFoundError(f"No se generó el archivo ejecutable: {output_exe}")
-
-                # Verificar el tamaño del archivo
-                if os.path.getsize(output_exe) == 0:
-                    raise ValueError("El archivo ejecutable generado está vacío")
-
-                logger.info("Compilación exitosa")
-                return True
-
-            except subprocess.TimeoutExpired:
-                process.kill()
+            for line in result.output:
+                logger.debug("%s: %s", backend.name, line)
+
+            if result.cancelled:
+                raise CompilationCancelled("Compilación cancelada por un error en otra variante")
+            if result.timed_out:
                 raise Exception("Tiempo de espera agotado durante la compilación")
 
+            self.map_diagnostics(result.diagnostics, content)
+            for diagnostic in result.diagnostics:
+                if not diagnostic.is_error:
+                    logger.warning("%s", diagnostic)
+
+            if result.errors or result.returncode != 0:
+                self.log_source_excerpts(result.errors, content)
+                if result.errors:
+                    error_msg = str(result.errors[0])
+                    if len(result.errors) > 1:
+                        error_msg += f" (y {len(result.errors) - 1} errores más)"
+                else:
+                    error_msg = '\n'.join(result.output[-5:]) or f"Error de compilación con código {result.returncode}"
+                raise Exception(error_msg)
+
+            # Verificar que el archivo se creó
+            if not os.path.exists(output_exe):
+                raise FileNotFoundError(f"No se generó el archivo ejecutable: {output_exe}")
+
+            # Verificar el tamaño del archivo
+            if os.path.getsize(output_exe) == 0:
+                raise ValueError("El archivo ejecutable generado está vacío")
+
+            if self.deterministic and not backend.supports(CAP_DETERMINISTIC):
+                # Sin /deterministic se fijan después la marca de tiempo, el MVID y el checksum
+                normalize_executable(output_exe)
+
+            if key and self.artifact_store is not None:
+                if self.artifact_store.publish(key, output_exe, compiler=backend.identity(),
+                                               name=os.path.basename(output_exe)):
+                    logger.info("Ejecutable publicado en el almacén de artefactos: %s", key[:12])
+
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            self.compiler_stats.record(backend.name, elapsed_ms)
+            with self._lock:
+                self.stage_timings.append(('compile', elapsed_ms))
+            logger.info("Compilación exitosa con %s en %.0f ms", backend.name, elapsed_ms)
+            return True
+
+        except CompilationCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error durante la compilación: {str(e)}")
-            # Intentar obtener más información sobre el error
-            if os.path.exists(cs_file):
-                logger.debug(f"Contenido del archivo fuente:")
-                with open(cs_file, 'r', encoding='utf-8') as f:
-                    logger.debug(f.read())
+            # Detener las demás variantes del trabajo
+            self._cancel_event.set()
             raise Exception(f"Error en la compilación: {str(e)}")
 
+    def input_hash(self, path):
+        """Hash del contenido de un archivo de entrada; se calcula una sola vez por trabajo"""
+        with self._lock:
+            digest = self._input_hashes.get(path)
+        if digest is None:
+            digest = hash_file(path)
+            with self._lock:
+                self._input_hashes[path] = digest
+        return digest
+
+    def compute_build_key(self, backend, content, output_exe, target, platform, manifest_file, icon_file):
+        """Clave de la compilación reproducible de una variante para el almacén de artefactos"""
+        inputs = {}
+        if manifest_file:
+            inputs['manifest'] = self.input_hash(manifest_file)
+        if icon_file:
+            inputs['icon'] = self.input_hash(icon_file)
+        if self.assets:
+            for resource in self.assets.resources():
+                blob_path, name = resource.rsplit(',', 1)
+                inputs[name] = self.input_hash(blob_path)
+        options = {
+            'target': target,
+            'platform': platform if backend.supports(CAP_PLATFORM) else None,
+            # El nombre del archivo de salida es también el nombre del ensamblado
+            'output': os.path.basename(output_exe),
+        }
+        return build_key(canonical_source(content), backend.identity(), options, inputs)
+
+    def map_diagnostics(self, diagnostics, content):
+        """Traduce las líneas del código generado que caen dentro del payload a líneas del script batch"""
+        if self.payload is None:
+            return
+        marker = content.find('private const string BatchPayload =')
+        if marker < 0:
+            return
+
+        # El literal empieza en la línea siguiente a la declaración, con un fragmento por línea del script
+        first_line = content.count('\n', 0, marker) + 2
+        line_count = max(len(self.payload.lines()), 1)
+        for diagnostic in diagnostics:
+            if diagnostic.line is None or not first_line <= diagnostic.line < first_line + line_count:
+                continue
+            batch_line = diagnostic.line - first_line + 1 - self.payload.prelude_lines
+            if batch_line >= 1:
+                diagnostic.batch_line = batch_line
+
+    def log_source_excerpts(self, diagnostics, content, context=3, max_excerpts=3, max_width=160):
+        """Registra unas pocas líneas del código generado alrededor de cada error"""
+        lines = content.splitlines()
+        for diagnostic in diagnostics[:max_excerpts]:
+            if diagnostic.line is None:
+                continue
+            first = max(diagnostic.line - context, 1)
+            last = min(diagnostic.line + context, len(lines))
+            excerpt = []
+            for number in range(first, last + 1):
+                text = lines[number - 1]
+                if len(text) > max_width:
+                    text = text[:max_width] + '...'
+                marker = '>' if number == diagnostic.line else ' '
+                excerpt.append(f"{marker} {number:5d} | {text}")
+            logger.error("Fragmento del código generado (%s):\n%s", diagnostic, '\n'.join(excerpt))
+
     def check_csc_compiler(self):
-        """Verifica que el compilador C# esté disponible"""
+        """Selecciona un compilador C# disponible para este trabajo"""
         logger.debug("Verificando disponibilidad del compilador C#")
+        required = [CAP_ICON]
+        if any(variant['admin_required'] for variant in self.build_variants()):
+            required.append(CAP_MANIFEST)
+        if self.config.get('assets'):
+            required.append(CAP_RESOURCES)
         try:
-            process = subprocess.run(
-                ['csc', '/help'], 
-                capture_output=True, 
-                text=True,
-                creationflags=subprocess.CREATE_NO_WINDOW
+            self.backend = select_backend(
+                self.config.get('compiler', 'auto'),
+                required=required,
+                stats=self.compiler_stats
             )
-            return process.returncode == 0
-        except FileNotFoundError:
-            logger.error("Compilador C# no encontrado")
+            return True
+        except (FileNotFoundError, ValueError) as e:
+            logger.error("Compilador C# no encontrado: %s", e)
             return False
 
     def check_dependencies(self):
         """Verifica todas las dependencias necesarias"""
         logger.debug("Verificando dependencias del sistema")
-        
-        # Verificar .NET Framework
+        if self.backend is not None:
+            self.backend.check_dependencies()
+
+
+    def build_variants(self):
+        """Devuelve las variantes a compilar (plataforma, administrador y consola)
+
+        Sin la opción 'matrix' se compila una única variante con la configuración
+        actual. 'matrix' admite un diccionario con listas o valores sueltos ('platforms',
+        'admin', 'console') cuyo producto cartesiano forma las variantes, o una lista de
+        diccionarios con las variantes exactas. Ambas formas aceptan las mismas
+        claves (ver preflight.VARIANT_KEYS) y cualquier otra es un error.
+        """
+        default = {
+            'platform': self.config.get('platform', 'anycpu'),
+            'admin_required': self.config.get('admin_required', False),
+            'console': self.config.get('console', False),
+        }
+        matrix = self.config.get('matrix')
+        if not matrix:
+            return [default]
+
+        if isinstance(matrix, dict):
+            axes = normalize_axes(matrix)
+            options = ('platform', 'admin_required', 'console')
+            values = [axes[option] if option in axes else [default[option]] for option in options]
+            entries = [dict(zip(options, combination)) for combination in itertools.product(*values)]
+        else:
+            entries = [dict(default, **normalize_variant(entry)) for entry in matrix]
+
+        variants = []
+        for entry in entries:
+            if entry['platform'] not in PLATFORMS:
+                raise ValueError(f"Plataforma no soportada: {entry['platform']}")
+            entry['admin_required'] = bool(entry['admin_required'])
+            entry['console'] = bool(entry['console'])
+            if entry not in variants:
+                variants.append(entry)
+        return variants
+
+    def variant_output_path(self, output_dir, variant, single):
+        """Ruta del ejecutable de una variante"""
+        name = self.config.get('output_name', 'output')
+        if not single:
+            name = '{}_{}_{}_{}'.format(
+                name,
+                variant['platform'],
+                'admin' if variant['admin_required'] else 'user',
+                'console' if variant['console'] else 'gui'
+            )
+        return os.path.join(output_dir, name + '.exe')
+
+    def expected_outputs(self):
+        """Rutas de todos los ejecutables que generará el trabajo"""
+        variants = self.build_variants()
+        output_dir = self.config.get('output_dir', 'dist')
+        return [self.variant_output_path(output_dir, variant, len(variants) == 1) for variant in variants]
+
+    def compile_variants(self, variants, sources, output_dir):
+        """Compila todas las variantes en paralelo y devuelve las rutas generadas"""
+        single = len(variants) == 1
+        jobs = []
+        for variant in variants:
+            cs_file = sources[(variant['admin_required'], variant['console'])]
+            jobs.append((variant, cs_file, self.variant_output_path(output_dir, variant, single)))
+
+        if single:
+            variant, cs_file, output_exe = jobs[0]
+            if not self.compile_cs_to_exe(cs_file, output_exe, **variant):
+                raise Exception("La compilación falló sin error específico")
+            return [output_exe]
+
+        max_workers = min(len(jobs), self.config.get('max_parallel_builds') or os.cpu_count() or 1)
+        completed = 0
+        errors = []
+        cancelled = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.compile_cs_to_exe, cs_file, output_exe, **variant): output_exe
+                for variant, cs_file, output_exe in jobs
+            }
+            for future in as_completed(futures):
+                output_exe = futures[future]
+                completed += 1
+                try:
+                    future.result()
+                    self.status.emit(f"Compilado: {os.path.basename(output_exe)}")
+                except CompilationCancelled:
+                    cancelled += 1
+                except Exception as e:
+                    errors.append(f"{os.path.basename(output_exe)}: {e}")
+                self.progress.emit(80 + 20 * completed // len(jobs))
+
+        if errors:
+            summary = "Fallaron {} de {} variantes".format(len(errors), len(jobs))
+            if cancelled:
+                summary += f" ({cancelled} canceladas)"
+            raise Exception("{}:\n{}".format(summary, '\n'.join(errors)))
+        return [output_exe for _, _, output_exe in jobs]
+
+    def read_previous_outputs(self, variants, output_dir):
+        """Lee los ejecutables de la compilación anterior, base de los parches binarios"""
+        single = len(variants) == 1
+        previous = {}
+        for variant in variants:
+            output_exe = self.variant_output_path(output_dir, variant, single)
+            if os.path.isfile(output_exe):
+                with open(output_exe, 'rb') as f:
+                    previous[output_exe] = f.read()
+        return previous
+
+    def write_deltas(self, previous):
+        """Genera un parche desde la versión anterior de cada ejecutable; devuelve sus rutas"""
+        deltas = []
+        for output_exe, old in previous.items():
+            with open(output_exe, 'rb') as f:
+                new = f.read()
+            if new == old:
+                logger.info("Sin cambios respecto a la versión anterior: %s", os.path.basename(output_exe))
+                continue
+
+            # El nombre incluye el hash de la versión de origen a la que se aplica
+            delta = create_delta(old, new)
+            delta_path = f"{output_exe}.{hashlib.sha256(old).hexdigest()[:12]}.delta"
+            with open(delta_path, 'wb') as f:
+                f.write(delta)
+            deltas.append(delta_path)
+            logger.info("Parche generado: %s (%d bytes, ejecutable de %d bytes)",
+                        os.path.basename(delta_path), len(delta), len(new))
+        return deltas
+
+    @contextmanager
+    def timed_stage(self, stage):
+        """Mide la duración de una etapa de la conversión para el historial"""
+        start_time = time.perf_counter()
         try:
-            key_path = r'SOFTWARE\Microsoft\NET Framework Setup\NDP\v4\Full'
-            import winreg
-            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, key_path) as key:
-                version = winreg.QueryValueEx(key, 'Version')[0]
-                logger.info(f"Versión de .NET Framework encontrada: {version}")
-        except Exception as e:
-            logger.error("No se encontró .NET Framework 4.0 o superior")
-            raise Exception("Se requiere .NET Framework 4.0 o superior")
+            yield
+        finally:
+            with self._lock:
+                self.stage_timings.append((stage, (time.perf_counter() - start_time) * 1000))
 
+    def record_history(self, started_at, total_ms, error=None):
+        """Registra el trabajo en el historial local de conversiones"""
+        if not self.config.get('record_history', True):
+            return
+        try:
+            output_path = None
+            output_size = None
+            if self.outputs:
+                output_path = self.outputs[0] if len(self.outputs) == 1 else os.path.dirname(self.outputs[0])
+                output_size = sum(os.path.getsize(path) for path in self.outputs if os.path.exists(path))
+
+            HistoryStore(self.config.get('history_db')).record(
+                {
+                    'started_at': started_at,
+                    'batch_file': os.path.abspath(self.config.get('batch_file') or ''),
+                    'input_hash': self.payload.sha256 if self.payload else None,
+                    'output_path': output_path,
+                    'output_size': output_size,
+                    'variants': len(self.outputs) or None,
+                    'compiler': self.backend.name if self.backend else None,
+                    'cache_hit': self.icon_cache_hit or self.artifact_hits > 0,
+                    'outcome': 'error' if error else 'success',
+                    'error': error,
+                    'total_ms': total_ms,
+                },
+                self.stage_timings
+            )
+        except Exception as e:
+            # El historial nunca debe hacer fallar una conversión
+            logger.warning("No se pudo registrar la conversión en el historial: %s", e)
 
     def run(self):
         """Ejecuta el proceso de conversión"""
         logger.info("Iniciando proceso de conversión")
-        temp_cs_file = os.path.abspath('temp_script.cs')
-        self.temp_files.append(temp_cs_file)
+        started_at = datetime.now().isoformat(timespec='seconds')
+        start_time = time.perf_counter()
+        error = None
 
         try:
-            # Verificar dependencias
-            self.status.emit("Verificando dependencias...")
-            self.progress.emit(5)
-            self.check_dependencies()
+            # Validar entradas y salidas antes de invocar nada
+            self.status.emit("Validando configuración...")
+            self.progress.emit(2)
+            with self.timed_stage('preflight'):
+                check_preflight(self.config)
 
             # Verificar compilador C#
             self.status.emit("Verificando compilador C#...")
+            self.progress.emit(5)
+            with self.timed_stage('select_compiler'):
+                if not self.check_csc_compiler():
+                    raise Exception("Compilador C# no encontrado")
+
+            # Verificar dependencias
+            self.status.emit("Verificando dependencias...")
             self.progress.emit(10)
-            if not self.check_csc_compiler():
-                raise Exception("Compilador C# no encontrado")
+            self.check_dependencies()
 
             # Leer archivo BAT
             self.status.emit("Leyendo archivo batch...")
             self.progress.emit(20)
-            with open(self.config['batch_file'], 'r', encoding='utf-8', errors='replace') as f:
-                bat_content = f.read()
-
-            # Generar archivo C#
+            with self.timed_stage('payload'):
+                payload = prepare_payload(
+                    self.config['batch_file'],
+                    self.config.get('codepage', DEFAULT_CODEPAGE)
+                )
+            # El límite se comprueba sobre los bytes que se embeben, antes de generar el código
+            check_payload_size(payload, self.config)
+            self.payload = payload
+
+            # Empaquetar los archivos adicionales
+            if self.config.get('assets'):
+                self.status.emit("Empaquetando archivos adicionales...")
+                self.progress.emit(30)
+                with self.timed_stage('assets'):
+                    self.assets = build_bundle(
+                        self.config['assets'],
+                        max_workers=self.config.get('max_parallel_builds')
+                    )
+
+            # Generar un archivo C# por cada combinación de administrador y consola;
+            # las variantes que solo difieren en la plataforma comparten el código
             self.status.emit("Generando código C#...")
             self.progress.emit(40)
-            cs_content = self.generate_cs_template(bat_content)
-            
-            # Guardar archivo C#
-            with open(temp_cs_file, 'w', encoding='utf-8') as f:
-                f.write(cs_content)
-
-            # Verificar archivo generado
-            if not os.path.exists(temp_cs_file):
-                raise FileNotFoundError(f"No se pudo crear el archivo: {temp_cs_file}")
+            variants = self.build_variants()
+            sources = {}
+            work_dir = os.path.abspath(self.config.get('work_dir') or os.getcwd())
+            os.makedirs(work_dir, exist_ok=True)
+            with self.timed_stage('generate'):
+                for variant in variants:
+                    key = (variant['admin_required'], variant['console'])
+                    if key in sources:
+                        continue
+
+                    suffix = ''
+                    if len(variants) > 1:
+                        suffix = '_{}_{}'.format('admin' if key[0] else 'user', 'console' if key[1] else 'gui')
+                    temp_cs_file = os.path.join(work_dir, f'temp_script{suffix}.cs')
+                    self.temp_files.append(temp_cs_file)
+
+                    cs_content = self.generate_cs_template(payload, admin_required=key[0], console=key[1])
+                    if self.deterministic:
+                        cs_content = canonical_source(cs_content)
+
+                    # Guardar archivo C# con saltos de línea LF en cualquier sistema
+                    with open(temp_cs_file, 'w', encoding='utf-8', newline='\n') as f:
+                        f.write(cs_content)
+
+                    # Verificar archivo generado
+                    if not os.path.exists(temp_cs_file):
+                        raise FileNotFoundError(f"No se pudo crear el archivo: {temp_cs_file}")
+                    sources[key] = temp_cs_file
 
             # Preparar compilación
             self.status.emit("Preparando compilación...")
             self.progress.emit(60)
+            with self.timed_stage('icon'):
+                self.get_icon_file()
             
             output_dir = self.config.get('output_dir', 'dist')
             os.makedirs(output_dir, exist_ok=True)
-            
-            output_exe = os.path.join(
-                output_dir,
-                self.config.get('output_name', 'output') + '.exe'
-            )
 
             # Compilar
-            self.status.emit("Compilando ejecutable...")
+            if len(variants) == 1:
+                self.status.emit("Compilando ejecutable...")
+            else:
+                self.status.emit(f"Compilando {len(variants)} variantes en paralelo...")
             self.progress.emit(80)
-            
-            success = self.compile_cs_to_exe(temp_cs_file, output_exe)
-            
-            if not success:
-                raise Exception("La compilación falló sin error específico")
+
+            # Guardar la versión anterior de cada ejecutable para generar los parches
+            previous = {}
+            if self.config.get('emit_delta', False):
+                previous = self.read_previous_outputs(variants, output_dir)
+
+            self.outputs = self.compile_variants(variants, sources, output_dir)
+
+            if previous:
+                self.status.emit("Generando parches binarios...")
+                with self.timed_stage('delta'):
+                    self.deltas = self.write_deltas(previous)
 
             self.progress.emit(100)
             self.status.emit("¡Conversión completada!")
@@ -610,6 +1694,8 @@ class ConversionWorker(QThread):
 
         except Exception as e:
             logger.exception("Error durante la conversión")
-            self.error.emit(str(e))
+            error = str(e)
+            self.error.emit(error)
         finally:
-            self.cleanup_temp_files()
\ No newline at end of file
+            self.record_history(started_at, (time.perf_counter() - start_time) * 1000, error)
+            self.cleanup_temp_files()
@@ -0,0 +1,295 @@
+import os
+import sys
+import zlib
+import bisect
+import struct
+import hashlib
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+# Cabecera: firma, tamaño original, tamaño nuevo, SHA-256 original y SHA-256 nuevo
+MAGIC = b'BCDELTA1'
+HEADER = struct.Struct('<8sQQ32s32s')
+
+# Tamaño de los bloques del archivo original que se indexan para buscar coincidencias
+BLOCK_SIZE = 32
+
+# Operaciones del flujo de instrucciones
+OP_COPY = b'C'
+OP_INSERT = b'I'
+
+# Candidatos más cercanos a la alineación actual que se evalúan para un bloque repetido
+MAX_CANDIDATES = 8
+
+# Tramo que se compara de una vez al extender una coincidencia
+COMPARE_STEP = 4096
+
+
+class DeltaError(ValueError):
+    """El parche no es válido o no corresponde al archivo de origen"""
+
+
+def _write_varint(output, value):
+    while value >= 0x80:
+        output.append((value & 0x7f) | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def _read_varint(data, position):
+    value = 0
+    shift = 0
+    while True:
+        if position >= len(data):
+            raise DeltaError("Instrucción truncada en el parche")
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _match_forward(old, old_start, new, new_start, limit):
+    """Longitud de la coincidencia entre old[old_start:] y new[new_start:], como mucho limit"""
+    length = 0
+    limit = min(limit, len(old) - old_start, len(new) - new_start)
+    while length + COMPARE_STEP <= limit and \
+            old[old_start + length:old_start + length + COMPARE_STEP] == new[new_start + length:new_start + length + COMPARE_STEP]:
+        length += COMPARE_STEP
+    while length < limit and old[old_start + length] == new[new_start + length]:
+        length += 1
+    return length
+
+
+def _match_backward(old, old_end, new, new_end, limit):
+    """Longitud de la coincidencia que termina en old[:old_end] y new[:new_end], como mucho limit"""
+    length = 0
+    limit = min(limit, old_end, new_end)
+    while length + COMPARE_STEP <= limit and \
+            old[old_end - length - COMPARE_STEP:old_end - length] == new[new_end - length - COMPARE_STEP:new_end - length]:
+        length += COMPARE_STEP
+    while length < limit and old[old_end - length - 1] == new[new_end - length - 1]:
+        length += 1
+    return length
+
+
+class _OpWriter:
+    """Acumula las instrucciones fusionando copias contiguas"""
+
+    def __init__(self):
+        self.stream = bytearray()
+        self._copy = None
+
+    def copy(self, offset, length):
+        if length <= 0:
+            return
+        if self._copy and self._copy[0] + self._copy[1] == offset:
+            self._copy[1] += length
+            return
+        self._flush_copy()
+        self._copy = [offset, length]
+
+    def insert(self, data):
+        if not data:
+            return
+        self._flush_copy()
+        self.stream += OP_INSERT
+        _write_varint(self.stream, len(data))
+        self.stream += data
+
+    def _flush_copy(self):
+        if self._copy:
+            self.stream += OP_COPY
+            _write_varint(self.stream, self._copy[0])
+            _write_varint(self.stream, self._copy[1])
+            self._copy = None
+
+    def finish(self):
+        self._flush_copy()
+        return bytes(self.stream)
+
+
+def create_delta(old, new):
+    """Genera un parche que transforma old en new
+
+    Se recortan el prefijo y el sufijo comunes y, en el resto, se buscan bloques
+    del original en cualquier posición del nuevo, extendiendo cada coincidencia
+    hacia ambos lados. Lo que no coincide se inserta literalmente y el flujo de
+    instrucciones se comprime con zlib.
+    """
+    old = bytes(old)
+    new = bytes(new)
+    writer = _OpWriter()
+
+    prefix = _match_forward(old, 0, new, 0, min(len(old), len(new)))
+    suffix = _match_backward(old, len(old), new, len(new), min(len(old), len(new)) - prefix)
+    old_end = len(old) - suffix
+    new_end = len(new) - suffix
+
+    writer.copy(0, prefix)
+
+    index = {}
+    for offset in range(prefix, old_end - BLOCK_SIZE + 1, BLOCK_SIZE):
+        index.setdefault(old[offset:offset + BLOCK_SIZE], []).append(offset)
+
+    position = prefix
+    pending = prefix
+    # Posición del original donde terminó la última copia: el texto del payload tiene
+    # muchos bloques repetidos y, entre ellos, se prefieren los cercanos a la alineación actual
+    copy_end = prefix
+    while position + BLOCK_SIZE <= new_end:
+        block = new[position:position + BLOCK_SIZE]
+        expected = copy_end + (position - pending)
+        if old[expected:expected + BLOCK_SIZE] == block:
+            candidates = [expected]
+        else:
+            offsets = index.get(block)
+            if offsets is None:
+                position += 1
+                continue
+            nearest = bisect.bisect_left(offsets, expected)
+            candidates = offsets[max(nearest - MAX_CANDIDATES // 2, 0):nearest + MAX_CANDIDATES // 2]
+
+        # Extender la coincidencia hacia delante y quedarse con el candidato más largo
+        limit = new_end - position - BLOCK_SIZE
+        length, offset = max(
+            (_match_forward(old, candidate + BLOCK_SIZE, new, position + BLOCK_SIZE, limit), candidate)
+            for candidate in candidates
+        )
+        length += BLOCK_SIZE
+        back = _match_backward(old, offset, new, position, position - pending)
+        writer.insert(new[pending:position - back])
+        writer.copy(offset - back, length + back)
+        position += length
+        pending = position
+        copy_end = offset + length
+
+    writer.insert(new[pending:new_end])
+    writer.copy(old_end, suffix)
+
+    header = HEADER.pack(MAGIC, len(old), len(new), hashlib.sha256(old).digest(), hashlib.sha256(new).digest())
+    return header + zlib.compress(writer.finish(), 9)
+
+
+def read_header(delta):
+    """Devuelve (tamaño original, tamaño nuevo, hash original, hash nuevo) del parche"""
+    if len(delta) < HEADER.size:
+        raise DeltaError("El parche está truncado")
+    magic, old_size, new_size, old_hash, new_hash = HEADER.unpack_from(delta)
+    if magic != MAGIC:
+        raise DeltaError("El archivo no es un parche válido")
+    return old_size, new_size, old_hash.hex(), new_hash.hex()
+
+
+def apply_delta(old, delta):
+    """Aplica el parche verificando el hash del original antes y el del resultado después"""
+    old_size, new_size, old_hash, new_hash = read_header(delta)
+    if len(old) != old_size or hashlib.sha256(old).hexdigest() != old_hash:
+        raise DeltaError("El archivo de origen no coincide con el que se usó para generar el parche")
+
+    try:
+        stream = zlib.decompress(delta[HEADER.size:])
+    except zlib.error as e:
+        raise DeltaError(f"El parche está dañado: {e}") from e
+
+    parts = []
+    position = 0
+    while position < len(stream):
+        op = stream[position:position + 1]
+        position += 1
+        if op == OP_COPY:
+            offset, position = _read_varint(stream, position)
+            length, position = _read_varint(stream, position)
+            if offset + length > len(old):
+                raise DeltaError("El parche copia fuera del archivo de origen")
+            parts.append(old[offset:offset + length])
+        elif op == OP_INSERT:
+            length, position = _read_varint(stream, position)
+            if position + length > len(stream):
+                raise DeltaError("Instrucción truncada en el parche")
+            parts.append(stream[position:position + length])
+            position += length
+        else:
+            raise DeltaError(f"Instrucción desconocida en el parche: {op!r}")
+
+    new = b''.join(parts)
+    if len(new) != new_size or hashlib.sha256(new).hexdigest() != new_hash:
+        raise DeltaError("El resultado del parche no coincide con el ejecutable esperado")
+    return new
+
+
+def create_delta_file(old_path, new_path, delta_path):
+    """Escribe el parche entre dos archivos y devuelve su tamaño"""
+    with open(old_path, 'rb') as f:
+        old = f.read()
+    with open(new_path, 'rb') as f:
+        new = f.read()
+    delta = create_delta(old, new)
+    with open(delta_path, 'wb') as f:
+        f.write(delta)
+    return len(delta)
+
+
+def apply_delta_file(old_path, delta_path, output_path=None):
+    """Aplica un parche a un archivo; sin output_path se reemplaza el original de forma atómica"""
+    output_path = output_path or old_path
+    with open(old_path, 'rb') as f:
+        old = f.read()
+    with open(delta_path, 'rb') as f:
+        delta = f.read()
+    new = apply_delta(old, delta)
+
+    temp_path = f'{output_path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(new)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Parches binarios entre versiones de un ejecutable')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    create_parser = subparsers.add_parser('create', help='Genera el parche de la versión anterior a la nueva')
+    create_parser.add_argument('old')
+    create_parser.add_argument('new')
+    create_parser.add_argument('delta')
+
+    apply_parser = subparsers.add_parser('apply', help='Aplica un parche verificando los hashes')
+    apply_parser.add_argument('old')
+    apply_parser.add_argument('delta')
+    apply_parser.add_argument('-o', '--output', help='Archivo de salida (por defecto se reemplaza el original)')
+
+    info_parser = subparsers.add_parser('info', help='Muestra la cabecera de un parche')
+    info_parser.add_argument('delta')
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'create':
+            size = create_delta_file(args.old, args.new, args.delta)
+            print(f"Parche generado: {args.delta} ({size} bytes, nuevo ejecutable: {os.path.getsize(args.new)} bytes)")
+        elif args.command == 'apply':
+            output = apply_delta_file(args.old, args.delta, args.output)
+            print(f"Parche aplicado: {output}")
+        elif args.command == 'info':
+            with open(args.delta, 'rb') as f:
+                old_size, new_size, old_hash, new_hash = read_header(f.read(HEADER.size))
+            print(f"Origen:    {old_size} bytes  sha256 {old_hash}")
+            print(f"Resultado: {new_size} bytes  sha256 {new_hash}")
+    except (DeltaError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
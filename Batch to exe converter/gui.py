@@ -1,16 +1,19 @@
 import sys
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QFileDialog, QVBoxLayout, QHBoxLayout,
-    QWidget, QCheckBox, QLabel, QMessageBox, QProgressBar, QComboBox, QGroupBox, QLineEdit
+    QWidget, QCheckBox, QLabel, QMessageBox, QProgressBar, QComboBox, QGroupBox, QLineEdit, QInputDialog
 )
-from PyQt6.QtCore import Qt, QSettings, pyqtSignal
+from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QIcon, QDragEnterEvent, QDropEvent
-import json
 import os
 import tempfile
 import shutil
 import subprocess
-from converter import ConversionWorker
+from converter import ConversionWorker, platform_options
+from compilers import PLATFORMS, available_backends
+from preflight import run_preflight
+from preview import ScriptPreview
+from settings import SettingsError, SettingsStore
 
 class DropWidget(QWidget):
     fileDropped = pyqtSignal(str)
@@ -35,16 +38,17 @@ class DropWidget(QWidget):
 class BatchConverter(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.available_compilers = []
         self.setup_compiler()  # Verificar y configurar el compilador C#
     
-        self.settings = QSettings('BatchConverter', 'Settings')
+        self.settings = SettingsStore()
         self.output_dir = ''
         self.load_settings()
         self.initUI()
 
     def initUI(self):
         self.setWindowTitle('Batch to EXE Converter')
-        self.setGeometry(100, 100, 600, 400)
+        self.setGeometry(100, 100, 600, 700)
         self.setWindowIcon(QIcon("favicon.ico"))
         self.setWindowFlags(Qt.WindowType.WindowCloseButtonHint | Qt.WindowType.WindowMinimizeButtonHint)
 
@@ -69,9 +73,17 @@ class BatchConverter(QMainWindow):
         self.select_button.clicked.connect(self.select_file)
         file_layout.addWidget(self.select_button)
         
-        self.icon_button = QPushButton('Seleccionar icono (.ico)', self)
+        self.icon_button = QPushButton('Seleccionar icono (.ico/.png)', self)
         self.icon_button.clicked.connect(self.select_icon)
         file_layout.addWidget(self.icon_button)
+
+        self.assets_button = QPushButton('Archivos adicionales...', self)
+        self.assets_button.clicked.connect(self.select_assets)
+        file_layout.addWidget(self.assets_button)
+
+        self.assets_label = QLabel('Archivos adicionales: ninguno')
+        self.assets_label.setWordWrap(True)
+        file_layout.addWidget(self.assets_label)
         
         self.output_dir_button = QPushButton('Seleccionar carpeta de salida', self)
         self.output_dir_button.clicked.connect(self.select_output_dir)
@@ -85,6 +97,14 @@ class BatchConverter(QMainWindow):
         file_group.setLayout(file_layout)
         main_layout.addWidget(file_group)
 
+        # Vista previa del script seleccionado
+        preview_group = QGroupBox("Vista previa")
+        preview_layout = QVBoxLayout()
+        self.preview = ScriptPreview(self)
+        preview_layout.addWidget(self.preview)
+        preview_group.setLayout(preview_layout)
+        main_layout.addWidget(preview_group)
+
         # Grupo de opciones
         options_group = QGroupBox("Opciones de conversión")
         options_layout = QVBoxLayout()
@@ -101,6 +121,56 @@ class BatchConverter(QMainWindow):
 
         self.admin_checkbox = QCheckBox('Ejecutar como administrador', self)
         options_layout.addWidget(self.admin_checkbox)
+
+        self.cache_checkbox = QCheckBox('Reutilizar el script extraído entre ejecuciones (caché)', self)
+        options_layout.addWidget(self.cache_checkbox)
+
+        self.delta_checkbox = QCheckBox('Generar un parche desde la versión anterior del ejecutable (delta)', self)
+        options_layout.addWidget(self.delta_checkbox)
+
+        self.telemetry_checkbox = QCheckBox('Registrar los tiempos de cada ejecución (telemetría local)', self)
+        options_layout.addWidget(self.telemetry_checkbox)
+
+        # Ruta en el equipo donde se ejecuta el .exe; admite variables de entorno
+        self.telemetry_file = QLineEdit(self)
+        self.telemetry_file.setPlaceholderText('%LOCALAPPDATA%\\BatchConverter\\telemetry.jsonl')
+        self.telemetry_file.setEnabled(False)
+        self.telemetry_checkbox.toggled.connect(self.telemetry_file.setEnabled)
+        options_layout.addWidget(self.telemetry_file)
+
+        compiler_label = QLabel('Compilador:')
+        self.compiler_combo = QComboBox()
+        self.compiler_combo.addItem('Automático', 'auto')
+        for name in self.available_compilers:
+            self.compiler_combo.addItem(name, name)
+        options_layout.addWidget(compiler_label)
+        options_layout.addWidget(self.compiler_combo)
+
+        # Con varias plataformas marcadas se genera un ejecutable por plataforma
+        platform_layout = QHBoxLayout()
+        self.platform_checkboxes = {}
+        for platform in PLATFORMS:
+            checkbox = QCheckBox(platform, self)
+            self.platform_checkboxes[platform] = checkbox
+            platform_layout.addWidget(checkbox)
+        platform_layout.addStretch()
+        options_layout.addWidget(QLabel('Plataformas:'))
+        options_layout.addLayout(platform_layout)
+
+        # Presets con nombre, compartidos con la línea de comandos (cli.py --preset)
+        preset_layout = QHBoxLayout()
+        self.preset_combo = QComboBox()
+        self.preset_combo.activated.connect(self.apply_preset)
+        preset_layout.addWidget(self.preset_combo, 1)
+        self.save_preset_button = QPushButton('Guardar preset...', self)
+        self.save_preset_button.clicked.connect(self.save_preset)
+        preset_layout.addWidget(self.save_preset_button)
+        self.delete_preset_button = QPushButton('Eliminar', self)
+        self.delete_preset_button.clicked.connect(self.delete_preset)
+        preset_layout.addWidget(self.delete_preset_button)
+        options_layout.addWidget(QLabel('Preset:'))
+        options_layout.addLayout(preset_layout)
+        self.update_preset_combo()
         
         options_group.setLayout(options_layout)
         main_layout.addWidget(options_group)
@@ -136,6 +206,7 @@ class BatchConverter(QMainWindow):
         # Variables para almacenar rutas
         self.batch_file = ''
         self.icon_file = ''
+        self.assets = []
 
         # Cargar preferencias guardadas
         self.load_preferences()
@@ -156,6 +227,7 @@ class BatchConverter(QMainWindow):
         if file_name:
             self.batch_file = file_name
             self.file_label.setText(f'Archivo seleccionado: {os.path.basename(file_name)}')
+            self.preview.load(file_name)
             self.save_settings()
 
     def select_icon(self):
@@ -163,12 +235,30 @@ class BatchConverter(QMainWindow):
             self,
             'Seleccionar icono',
             '',
-            'Icon files (*.ico)'
+            'Icon files (*.ico *.png)'
         )
         if icon_name:
             self.icon_file = icon_name
             self.save_settings()
 
+    def select_assets(self):
+        file_names, _ = QFileDialog.getOpenFileNames(
+            self,
+            'Seleccionar archivos adicionales',
+            '',
+            'All files (*)'
+        )
+        # Cancelar el diálogo deja la selección vacía: no se embebe ningún archivo
+        self.assets = file_names
+        self.update_assets_label()
+
+    def update_assets_label(self):
+        if self.assets:
+            names = ', '.join(os.path.basename(path) for path in self.assets)
+            self.assets_label.setText(f'Archivos adicionales ({len(self.assets)}): {names}')
+        else:
+            self.assets_label.setText('Archivos adicionales: ninguno')
+
     def select_output_dir(self):
         dir_name = QFileDialog.getExistingDirectory(self, 'Seleccionar carpeta de salida')
         if dir_name:
@@ -183,20 +273,24 @@ class BatchConverter(QMainWindow):
         self.move(qr.topLeft())
 
     def load_settings(self):
-        self.batch_file = self.settings.value('batch_file', '')
-        self.icon_file = self.settings.value('icon_file', '')
-        self.output_dir = self.settings.value('output_dir', '')
-        self.theme = self.settings.value('theme', 'Claro')
+        self.batch_file = self.settings.get('batch_file', '')
+        self.icon_file = self.settings.get('icon_file', '')
+        self.output_dir = self.settings.get('output_dir', '')
+        self.theme = self.settings.get('theme', 'Claro')
 
     def save_settings(self):
-        self.settings.setValue('batch_file', self.batch_file)
-        self.settings.setValue('icon_file', self.icon_file)
-        self.settings.setValue('output_dir', self.output_dir)
-        self.settings.setValue('theme', self.theme_combo.currentText())
+        # Solo actualiza la memoria; el archivo se escribe agrupado en segundo plano
+        self.settings.update(
+            batch_file=self.batch_file,
+            icon_file=self.icon_file,
+            output_dir=self.output_dir,
+            theme=self.theme_combo.currentText(),
+        )
 
     def handle_dropped_file(self, file_path):
         self.batch_file = file_path
         self.file_label.setText(f'Archivo seleccionado: {os.path.basename(file_path)}')
+        self.preview.load(file_path)
         self.save_settings()
 
     def change_theme(self, theme_name):
@@ -230,36 +324,7 @@ class BatchConverter(QMainWindow):
         self.save_settings()
 
     def convert_to_exe(self):
-        if not self.batch_file:
-            QMessageBox.warning(self, 'Error', 'Por favor seleccione un archivo batch')
-            return
-        
-        if not self.output_name.text().strip():
-            QMessageBox.warning(self, 'Error', 'Debe ingresar un nombre para el ejecutable')
-            self.output_name.setFocus() 
-            return
-
-        # Verificar permisos de escritura en el directorio de salida
         output_dir = self.output_dir or 'dist'
-        try:
-            os.makedirs(output_dir, exist_ok=True)
-            test_file = os.path.join(output_dir, 'test.tmp')
-            with open(test_file, 'w') as f:
-                f.write('test')
-            os.remove(test_file)
-        except Exception as e:
-            QMessageBox.critical(
-                self, 
-                'Error', 
-                f'No hay permisos de escritura en el directorio de salida: {str(e)}'
-            )
-            return
-
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setValue(0)
-        self.convert_button.setEnabled(False)
-        self.status_label.setText('Iniciando conversión...')
-
         config = {
             'batch_file': self.batch_file,
             'icon_file': self.icon_file,
@@ -268,8 +333,36 @@ class BatchConverter(QMainWindow):
             'console': self.console_checkbox.isChecked(),
             'center_window': self.center_checkbox.isChecked(),
             'admin_required': self.admin_checkbox.isChecked(),
+            'compiler': self.compiler_combo.currentData(),
+            'extraction_cache': self.cache_checkbox.isChecked(),
+            'emit_delta': self.delta_checkbox.isChecked(),
+            'telemetry': self.telemetry_checkbox.isChecked(),
+            'telemetry_file': self.telemetry_file.text().strip(),
+            'assets': list(self.assets),
             'keep_temp_files': False 
         }
+        platforms = self.selected_platforms()
+        if platforms:
+            config.update(platform_options(platforms))
+
+        # Validar todo antes de empezar y mostrar todos los problemas a la vez
+        problems = run_preflight(config)
+        if not platforms:
+            problems.append('No se seleccionó ninguna plataforma')
+        if problems:
+            QMessageBox.warning(
+                self,
+                'Error',
+                'No se puede iniciar la conversión:\n\n' + '\n'.join(f'- {problem}' for problem in problems)
+            )
+            if not self.output_name.text().strip():
+                self.output_name.setFocus()
+            return
+
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.convert_button.setEnabled(False)
+        self.status_label.setText('Iniciando conversión...')
 
         self.worker = ConversionWorker(config)
         self.worker.progress.connect(self.update_progress)
@@ -284,14 +377,12 @@ class BatchConverter(QMainWindow):
     def conversion_finished(self):
         self.progress_bar.setVisible(False)
         self.convert_button.setEnabled(True)
-        output_path = os.path.join(
-            self.output_dir or 'dist',
-            f"{self.output_name.text()}.exe"
-        )
+        # Con varias plataformas se crea un ejecutable por cada una
+        output_paths = '\n'.join(self.worker.outputs)
         QMessageBox.information(
             self, 
             'Éxito', 
-            f'Conversión completada exitosamente.\nArchivo creado: {output_path}'
+            f'Conversión completada exitosamente.\nArchivos creados:\n{output_paths}'
         )
 
     def conversion_error(self, error_message):
@@ -300,36 +391,85 @@ class BatchConverter(QMainWindow):
         QMessageBox.critical(self, 'Error', f'Error durante la conversión: {error_message}')
 
     def load_preferences(self):
-        try:
-            if os.path.exists('preferences.json'):
-                with open('preferences.json', 'r') as f:
-                    prefs = json.load(f)
-                    self.theme_combo.setCurrentText(prefs.get('theme', 'Claro'))
-                    self.console_checkbox.setChecked(prefs.get('console', False))
-                    self.center_checkbox.setChecked(prefs.get('center_window', False))
-                    self.admin_checkbox.setChecked(prefs.get('admin_required', False))
-                    self.output_name.setText(prefs.get('output_name', ''))
-        except Exception as e:
-            print(f"Error loading preferences: {e}")
+        self.theme_combo.setCurrentText(self.settings.get('theme', 'Claro'))
+        self.output_name.setText(self.settings.get('output_name', ''))
+        self.apply_options(self.settings.options)
 
     def save_preferences(self):
-        prefs = {
-            'theme': self.theme_combo.currentText(),
+        self.settings.update(output_name=self.output_name.text())
+        self.settings.set_options(self.current_options())
+
+    def apply_options(self, options):
+        self.console_checkbox.setChecked(options.get('console', False))
+        self.center_checkbox.setChecked(options.get('center_window', False))
+        self.admin_checkbox.setChecked(options.get('admin_required', False))
+        self.cache_checkbox.setChecked(options.get('extraction_cache', False))
+        self.delta_checkbox.setChecked(options.get('emit_delta', False))
+        self.telemetry_checkbox.setChecked(options.get('telemetry', False))
+        self.telemetry_file.setText(options.get('telemetry_file', ''))
+        index = self.compiler_combo.findData(options.get('compiler', 'auto'))
+        self.compiler_combo.setCurrentIndex(max(index, 0))
+        platforms = options.get('platforms') or ['anycpu']
+        for platform, checkbox in self.platform_checkboxes.items():
+            checkbox.setChecked(platform in platforms)
+
+    def selected_platforms(self):
+        return [platform for platform, checkbox in self.platform_checkboxes.items() if checkbox.isChecked()]
+
+    def current_options(self):
+        return {
             'console': self.console_checkbox.isChecked(),
             'center_window': self.center_checkbox.isChecked(),
             'admin_required': self.admin_checkbox.isChecked(),
-            'output_name': self.output_name.text()
+            'extraction_cache': self.cache_checkbox.isChecked(),
+            'emit_delta': self.delta_checkbox.isChecked(),
+            'telemetry': self.telemetry_checkbox.isChecked(),
+            'telemetry_file': self.telemetry_file.text().strip(),
+            'compiler': self.compiler_combo.currentData(),
+            'platforms': self.selected_platforms(),
         }
+
+    def update_preset_combo(self, current=None):
+        self.preset_combo.clear()
+        self.preset_combo.addItem('(sin preset)', None)
+        for name in self.settings.preset_names():
+            self.preset_combo.addItem(name, name)
+        index = self.preset_combo.findData(current)
+        self.preset_combo.setCurrentIndex(max(index, 0))
+        self.delete_preset_button.setEnabled(current is not None and index > 0)
+
+    def apply_preset(self, index):
+        name = self.preset_combo.itemData(index)
+        self.delete_preset_button.setEnabled(name is not None)
+        if name is not None:
+            self.apply_options(self.settings.preset(name))
+
+    def save_preset(self):
+        name, accepted = QInputDialog.getText(
+            self, 'Guardar preset', 'Nombre del preset:', text=self.preset_combo.currentData() or ''
+        )
+        if not accepted:
+            return
         try:
-            with open('preferences.json', 'w') as f:
-                json.dump(prefs, f)
-        except Exception as e:
-            print(f"Error saving preferences: {e}")
+            self.settings.save_preset(name, self.current_options())
+        except SettingsError as e:
+            QMessageBox.warning(self, 'Error', str(e))
+            return
+        self.update_preset_combo(name.strip())
+
+    def delete_preset(self):
+        name = self.preset_combo.currentData()
+        if name is not None:
+            self.settings.delete_preset(name)
+            self.update_preset_combo()
 
     def closeEvent(self, event):
+        self.preview.close_file()
         self.cleanup_temp_files()
         self.save_preferences()
         self.save_settings()
+        # Al cerrar se escribe de inmediato lo que quede pendiente
+        self.settings.flush()
         event.accept()
 
     def cleanup_temp_files(self):
@@ -353,49 +493,36 @@ class BatchConverter(QMainWindow):
 
 
     def check_csc_compiler(self):
-        """Verifica la disponibilidad del compilador C# y su ubicación"""
-        possible_paths = [
-            r"C:\Windows\Microsoft.NET\Framework64\v4.0.30319\csc.exe",
-            r"C:\Windows\Microsoft.NET\Framework\v4.0.30319\csc.exe"
-        ]
-        
-        # Primero intentar con el PATH del sistema
-        try:
-            subprocess.run(
-                ['csc', '/help'],
-                capture_output=True,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            return True, "PATH del sistema"
-        except FileNotFoundError:
-            # Si no está en el PATH, buscar en las ubicaciones conocidas
-            for path in possible_paths:
-                if os.path.exists(path):
-                    return True, path
-            
+        """Verifica qué compiladores C# están disponibles y su ubicación"""
+        backends = available_backends()
+        if not backends:
             return False, None
+        return True, backends
 
     def setup_compiler(self):
         """Configura el acceso al compilador C#"""
-        is_available, compiler_path = self.check_csc_compiler()
+        is_available, backends = self.check_csc_compiler()
         
         if not is_available:
             QMessageBox.critical(
                 self,
                 'Error',
-                'No se encontró el compilador C# (csc.exe).\n'
-                'Para resolver esto:\n\n'
+                'No se encontró ningún compilador C# (csc.exe, Roslyn o mcs).\n'
+                'Para resolver esto en Windows:\n\n'
                 '1. Abra el Panel de Control\n'
                 '2. Vaya a "Programas y características"\n'
                 '3. Habilite ".NET Framework 4.8 Advanced Services"\n'
-                '4. Reinicie el sistema'
+                '4. Reinicie el sistema\n\n'
+                'En Linux instale Mono (mcs) o el SDK de dotnet.'
             )
             sys.exit(1)
         else:
-            # Si el compilador no está en el PATH pero existe en una ubicación conocida
-            if compiler_path != "PATH del sistema":
-                # Agregar al PATH temporal
-                os.environ['PATH'] = f"{os.path.dirname(compiler_path)};{os.environ['PATH']}"
+            self.available_compilers = [backend.name for backend in backends]
+            # Si el compilador de .NET Framework no está en el PATH, agregarlo al PATH temporal
+            for backend in backends:
+                compiler_path = backend.executable()[0]
+                if backend.name == 'csc' and os.path.dirname(compiler_path) not in os.environ['PATH']:
+                    os.environ['PATH'] = f"{os.path.dirname(compiler_path)};{os.environ['PATH']}"
 
     def show_dotnet_download_info(self):
         msg = QMessageBox()
@@ -420,4 +547,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,196 @@
+import os
+import sys
+import sqlite3
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from paths import user_data_dir
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS conversions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    batch_file TEXT,
+    input_hash TEXT,
+    output_path TEXT,
+    output_size INTEGER,
+    variants INTEGER,
+    compiler TEXT,
+    cache_hit INTEGER NOT NULL DEFAULT 0,
+    outcome TEXT NOT NULL,
+    error TEXT,
+    total_ms REAL
+);
+CREATE TABLE IF NOT EXISTS stages (
+    conversion_id INTEGER NOT NULL REFERENCES conversions(id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    duration_ms REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversions_started ON conversions(started_at);
+CREATE INDEX IF NOT EXISTS idx_conversions_batch ON conversions(batch_file);
+CREATE INDEX IF NOT EXISTS idx_stages_conversion ON stages(conversion_id);
+'''
+
+
+def percentile(values, fraction):
+    """Percentil por interpolación lineal de una lista de valores"""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class HistoryStore:
+    """Historial local de conversiones con sus métricas de rendimiento (SQLite)"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(user_data_dir(), 'history.sqlite3')
+        self._lock = threading.Lock()
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA foreign_keys=ON')
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def record(self, entry, stages):
+        """Guarda un trabajo y la duración de cada una de sus etapas"""
+        with self._lock, self._connect() as connection:
+            cursor = connection.execute(
+                '''INSERT INTO conversions (started_at, batch_file, input_hash, output_path, output_size,
+                                            variants, compiler, cache_hit, outcome, error, total_ms)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                (
+                    entry.get('started_at') or datetime.now().isoformat(timespec='seconds'),
+                    entry.get('batch_file'),
+                    entry.get('input_hash'),
+                    entry.get('output_path'),
+                    entry.get('output_size'),
+                    entry.get('variants'),
+                    entry.get('compiler'),
+                    1 if entry.get('cache_hit') else 0,
+                    entry.get('outcome', 'success'),
+                    entry.get('error'),
+                    entry.get('total_ms'),
+                )
+            )
+            conversion_id = cursor.lastrowid
+            connection.executemany(
+                'INSERT INTO stages (conversion_id, stage, duration_ms) VALUES (?, ?, ?)',
+                [(conversion_id, stage, duration_ms) for stage, duration_ms in stages]
+            )
+            return conversion_id
+
+    def recent(self, limit=20):
+        with self._connect() as connection:
+            return connection.execute(
+                '''SELECT started_at, batch_file, compiler, outcome, output_size, total_ms, cache_hit
+                   FROM conversions ORDER BY id DESC LIMIT ?''',
+                (limit,)
+            ).fetchall()
+
+    def slowest(self, limit=10):
+        """Scripts con mayor tiempo medio de conversión"""
+        with self._connect() as connection:
+            return connection.execute(
+                '''SELECT batch_file, COUNT(*), AVG(total_ms), MAX(total_ms)
+                   FROM conversions WHERE outcome = 'success'
+                   GROUP BY batch_file ORDER BY AVG(total_ms) DESC LIMIT ?''',
+                (limit,)
+            ).fetchall()
+
+    def compile_percentiles(self, fraction=0.95):
+        """Percentil del tiempo de compilación agrupado por compilador"""
+        with self._connect() as connection:
+            rows = connection.execute(
+                '''SELECT c.compiler, s.duration_ms FROM stages s
+                   JOIN conversions c ON c.id = s.conversion_id
+                   WHERE s.stage = 'compile' AND c.outcome = 'success' '''
+            ).fetchall()
+
+        durations = {}
+        for compiler, duration_ms in rows:
+            durations.setdefault(compiler, []).append(duration_ms)
+        return [
+            (compiler, len(values), percentile(values, 0.5), percentile(values, fraction))
+            for compiler, values in sorted(durations.items())
+        ]
+
+    def size_growth(self, limit=10):
+        """Scripts cuyo ejecutable más ha crecido entre la primera y la última conversión"""
+        with self._connect() as connection:
+            rows = connection.execute(
+                '''SELECT batch_file, output_size FROM conversions
+                   WHERE outcome = 'success' AND output_size IS NOT NULL
+                   ORDER BY id'''
+            ).fetchall()
+
+        sizes = {}
+        for batch_file, output_size in rows:
+            sizes.setdefault(batch_file, []).append(output_size)
+
+        growth = []
+        for batch_file, values in sizes.items():
+            if len(values) > 1:
+                growth.append((batch_file, len(values), values[0], values[-1], values[-1] - values[0]))
+        growth.sort(key=lambda item: item[4], reverse=True)
+        return growth[:limit]
+
+
+def _print_table(headers, rows):
+    rows = [['' if value is None else (f'{value:.0f}' if isinstance(value, float) else str(value))
+             for value in row] for row in rows]
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    print('  '.join(header.ljust(width) for header, width in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Consulta el historial de conversiones')
+    parser.add_argument('--db', help='Ruta de la base de datos del historial')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    recent_parser = subparsers.add_parser('recent', help='Últimas conversiones')
+    recent_parser.add_argument('-n', type=int, default=20)
+    slowest_parser = subparsers.add_parser('slowest', help='Scripts más lentos')
+    slowest_parser.add_argument('-n', type=int, default=10)
+    p95_parser = subparsers.add_parser('p95', help='Percentil 95 del tiempo de compilación por compilador')
+    p95_parser.add_argument('--percentile', type=float, default=95)
+    growth_parser = subparsers.add_parser('growth', help='Crecimiento del tamaño de los ejecutables')
+    growth_parser.add_argument('-n', type=int, default=10)
+
+    args = parser.parse_args(argv)
+    store = HistoryStore(args.db)
+
+    if args.command == 'recent':
+        _print_table(['inicio', 'script', 'compilador', 'resultado', 'bytes', 'ms', 'caché'], store.recent(args.n))
+    elif args.command == 'slowest':
+        _print_table(['script', 'trabajos', 'media ms', 'máx ms'], store.slowest(args.n))
+    elif args.command == 'p95':
+        label = f'p{args.percentile:g} ms'
+        _print_table(['compilador', 'muestras', 'mediana ms', label],
+                     store.compile_percentiles(args.percentile / 100))
+    elif args.command == 'growth':
+        _print_table(['script', 'trabajos', 'primer tamaño', 'último tamaño', 'diferencia'],
+                     store.size_growth(args.n))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
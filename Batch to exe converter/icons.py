@@ -0,0 +1,263 @@
+import io
+import os
+import zlib
+import struct
+import hashlib
+import logging
+import threading
+
+from paths import user_data_dir
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Tamaños que usa Windows para el icono de un ejecutable
+DEFAULT_SIZES = (16, 32, 48, 256)
+
+# Las imágenes a partir de este tamaño se guardan comprimidas en PNG dentro del ICO
+PNG_MIN_SIZE = 64
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+ICO_SIGNATURE = b'\x00\x00\x01\x00'
+
+# Iconos ya procesados en esta ejecución: hash del contenido -> ruta del ICO optimizado
+_memory_cache = {}
+_memory_lock = threading.Lock()
+
+
+class IconError(ValueError):
+    """El archivo de icono no es válido o no se puede procesar"""
+
+
+class IconImage:
+    """Una imagen dentro de un archivo ICO"""
+
+    def __init__(self, width, height, bit_count, data):
+        self.width = width
+        self.height = height
+        self.bit_count = bit_count
+        self.data = data
+
+    @property
+    def is_png(self):
+        return self.data.startswith(PNG_SIGNATURE)
+
+
+def detect_icon_format(data):
+    """Devuelve 'png', 'ico' o None según la firma del archivo"""
+    if data.startswith(PNG_SIGNATURE):
+        return 'png'
+    if data.startswith(ICO_SIGNATURE):
+        return 'ico'
+    return None
+
+
+def png_size(data):
+    """Lee el ancho y alto de la cabecera IHDR de un PNG"""
+    if len(data) < 24 or data[12:16] != b'IHDR':
+        raise IconError("PNG sin cabecera IHDR")
+    return struct.unpack('>II', data[16:24])
+
+
+def parse_ico(data):
+    """Extrae las imágenes de un archivo ICO"""
+    if len(data) < 6 or not data.startswith(ICO_SIGNATURE):
+        raise IconError("El archivo no es un icono ICO válido")
+
+    count = struct.unpack_from('<H', data, 4)[0]
+    if count == 0 or len(data) < 6 + count * 16:
+        raise IconError("El icono no contiene imágenes")
+
+    images = []
+    for index in range(count):
+        width, height, _, _, _, bit_count, size, offset = struct.unpack_from('<BBBBHHII', data, 6 + index * 16)
+        if offset + size > len(data):
+            raise IconError(f"La imagen {index} del icono está truncada")
+        image_data = data[offset:offset + size]
+        if image_data.startswith(PNG_SIGNATURE):
+            width, height = png_size(image_data)
+        else:
+            width = width or 256
+            height = height or 256
+        images.append(IconImage(width, height, bit_count, image_data))
+    return images
+
+
+def build_ico(images):
+    """Construye un archivo ICO a partir de una lista de imágenes"""
+    header = struct.pack('<HHH', 0, 1, len(images))
+    offset = len(header) + 16 * len(images)
+    entries = []
+    for image in images:
+        entries.append(struct.pack(
+            '<BBBBHHII',
+            image.width if image.width < 256 else 0,
+            image.height if image.height < 256 else 0,
+            0, 0, 1, image.bit_count, len(image.data), offset
+        ))
+        offset += len(image.data)
+    return header + b''.join(entries) + b''.join(image.data for image in images)
+
+
+def _png_chunk(kind, payload):
+    return struct.pack('>I', len(payload)) + kind + payload + struct.pack('>I', zlib.crc32(kind + payload))
+
+
+def encode_png(width, height, rgba):
+    """Codifica píxeles RGBA (de arriba a abajo) como PNG sin dependencias externas"""
+    stride = width * 4
+    raw = b''.join(b'\x00' + rgba[row * stride:(row + 1) * stride] for row in range(height))
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+        + _png_chunk(b'IDAT', zlib.compress(raw, 9))
+        + _png_chunk(b'IEND', b'')
+    )
+
+
+def dib_to_png(image):
+    """Convierte una imagen DIB de 32 bits con canal alfa a PNG; devuelve None si no es posible"""
+    if image.is_png or len(image.data) < 40:
+        return None
+
+    header_size, width, height, _, bit_count = struct.unpack_from('<IiiHH', image.data, 0)
+    height //= 2  # El DIB de un icono incluye la máscara AND en la altura
+    if bit_count != 32 or width <= 0 or height <= 0:
+        return None
+
+    stride = width * 4
+    pixels = image.data[header_size:header_size + stride * height]
+    if len(pixels) < stride * height:
+        return None
+
+    # Los iconos de 32 bits sin alfa dependen de la máscara AND: se dejan como están
+    bgra = bytearray(b''.join(pixels[row * stride:(row + 1) * stride] for row in reversed(range(height))))
+    if not any(bgra[3::4]):
+        return None
+
+    rgba = bytearray(len(bgra))
+    rgba[0::4] = bgra[2::4]
+    rgba[1::4] = bgra[1::4]
+    rgba[2::4] = bgra[0::4]
+    rgba[3::4] = bgra[3::4]
+    return IconImage(width, height, 32, encode_png(width, height, bytes(rgba)))
+
+
+def _optimize_with_pillow(data, sizes):
+    """Genera el ICO con Pillow; cualquier error al decodificar la imagen se convierte en IconError"""
+    try:
+        return _resize_with_pillow(data, sizes)
+    except IconError:
+        raise
+    except Exception as e:
+        # UnidentifiedImageError, OSError de imágenes dañadas, DecompressionBombError...
+        raise IconError(f"No se pudo procesar la imagen con Pillow: {e}") from e
+
+
+def _resize_with_pillow(data, sizes):
+    """Genera el ICO redimensionando con Pillow a los tamaños necesarios"""
+    with Image.open(io.BytesIO(data)) as source:
+        source.load()
+        largest = max(source.size)
+        # No se amplía la imagen: solo tamaños menores o iguales al original
+        targets = [(size, size) for size in sizes if size <= largest]
+        # Se conserva también el tamaño original como versión de alta resolución
+        if largest <= 256 and (largest, largest) not in targets:
+            targets.append((largest, largest))
+        output = io.BytesIO()
+        source.convert('RGBA').save(output, format='ICO', sizes=targets)
+        return output.getvalue()
+
+
+def _optimize_without_pillow(data, icon_format, sizes):
+    """Genera el ICO seleccionando y recomprimiendo las imágenes existentes"""
+    if icon_format == 'png':
+        width, height = png_size(data)
+        if width != height or width > 256:
+            raise IconError("Para usar un PNG no cuadrado o mayor de 256 px se necesita Pillow")
+        return build_ico([IconImage(width, height, 32, data)])
+
+    images = parse_ico(data)
+
+    # Para cada tamaño necesario, la imagen con más profundidad de color
+    best = {}
+    for image in images:
+        if image.width != image.height or image.width not in sizes:
+            continue
+        current = best.get(image.width)
+        if current is None or image.bit_count > current.bit_count:
+            best[image.width] = image
+
+    # Si ningún tamaño coincide se conserva la imagen más grande
+    selected = [best[size] for size in sorted(best)] or [max(images, key=lambda image: (image.width, image.bit_count))]
+
+    result = []
+    for image in selected:
+        if image.width >= PNG_MIN_SIZE:
+            image = dib_to_png(image) or image
+        result.append(image)
+    return build_ico(result)
+
+
+def validate_icon(path):
+    """Comprueba rápidamente que el archivo sea un ICO o PNG válido; lanza IconError si no"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    icon_format = detect_icon_format(data)
+    if icon_format == 'png':
+        png_size(data)
+    elif icon_format == 'ico':
+        parse_ico(data)
+    else:
+        raise IconError("El icono debe ser un archivo .ico o .png")
+    return icon_format
+
+
+def prepare_icon(path, sizes=DEFAULT_SIZES):
+    """Convierte el icono (ICO o PNG) en un ICO optimizado y cacheado por hash de contenido
+
+    Devuelve la ruta del ICO optimizado y si se obtuvo de la caché.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    icon_format = detect_icon_format(data)
+    if icon_format is None:
+        raise IconError("El icono debe ser un archivo .ico o .png")
+
+    sizes = tuple(sorted(set(sizes)))
+    method = 'pillow' if Image is not None else 'builtin'
+    key = hashlib.sha256(data + repr((sizes, method)).encode('ascii')).hexdigest()
+
+    with _memory_lock:
+        if key in _memory_cache and os.path.exists(_memory_cache[key]):
+            return _memory_cache[key], True
+
+    cached_path = os.path.join(user_data_dir('icons'), key + '.ico')
+    if os.path.exists(cached_path):
+        with _memory_lock:
+            _memory_cache[key] = cached_path
+        return cached_path, True
+
+    if Image is not None:
+        optimized = _optimize_with_pillow(data, sizes)
+    else:
+        optimized = _optimize_without_pillow(data, icon_format, sizes)
+
+    # Si el resultado no mejora el original (y ya era ICO) se usa el original
+    if icon_format == 'ico' and len(optimized) >= len(data):
+        optimized = data
+
+    temp_path = f'{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(optimized)
+    os.replace(temp_path, cached_path)
+
+    logger.info("Icono optimizado: %d -> %d bytes", len(data), len(optimized))
+    with _memory_lock:
+        _memory_cache[key] = cached_path
+    return cached_path, False
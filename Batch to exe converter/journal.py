@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Estados por los que pasa un trabajo
+STATE_STARTED = 'started'
+STATE_COMPLETED = 'completed'
+STATE_FAILED = 'failed'
+
+# Se compacta el diario cuando tiene más de este número de registros por trabajo
+COMPACT_RATIO = 4
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def job_id(config):
+    """Identificador estable de un trabajo a partir de su configuración"""
+    canonical = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+class RunJournal:
+    """Diario de solo anexado con las transiciones de estado de los trabajos de una ejecución
+
+    Cada transición es una línea JSON escrita con una única llamada a write y
+    sincronizada con fsync antes de continuar, de modo que tras una caída el diario
+    contiene todas las transiciones confirmadas y, como mucho, una última línea
+    incompleta que se descarta al leerlo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = None
+        self.jobs = {}
+        self._records = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._replay()
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Línea incompleta de una escritura interrumpida
+                    logger.warning("Registro dañado en la línea %d del diario; se ignora", number)
+                    continue
+                self._records += 1
+                self.jobs.setdefault(record['job'], {}).update(record)
+
+    def open(self):
+        with self._lock:
+            if self._fd is None:
+                # Un registro incompleto al final se cierra para que el siguiente empiece en su línea
+                needs_newline = False
+                if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                    with open(self.path, 'rb') as f:
+                        f.seek(-1, os.SEEK_END)
+                        needs_newline = f.read(1) != b'\n'
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, 'O_BINARY', 0), 0o644)
+                if needs_newline:
+                    os.write(self._fd, b'\n')
+        return self
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, job, state, **fields):
+        """Añade una transición de estado y la sincroniza con el disco"""
+        entry = {'job': job, 'state': state, 'ts': datetime.now().isoformat(timespec='seconds')}
+        entry.update(fields)
+        line = (json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._lock:
+            os.write(self._fd, line)
+            os.fsync(self._fd)
+            self._records += 1
+            self.jobs.setdefault(job, {}).update(entry)
+
+    def state(self, job):
+        return self.jobs.get(job, {}).get('state')
+
+    def recorded_inputs(self, job):
+        """Entradas adicionales (icono, compilador) con que terminó el trabajo la última vez"""
+        return self.jobs.get(job, {}).get('inputs') or {}
+
+    def is_done(self, job, input_hash, inputs=None):
+        """Un trabajo está hecho si terminó con las mismas entradas y sus salidas siguen intactas"""
+        entry = self.jobs.get(job)
+        if not entry or entry.get('state') != STATE_COMPLETED or entry.get('input_hash') != input_hash:
+            return False
+        if inputs is not None and entry.get('inputs') != inputs:
+            return False
+        outputs = entry.get('outputs') or {}
+        try:
+            return bool(outputs) and all(file_sha256(path) == digest for path, digest in outputs.items())
+        except OSError:
+            return False
+
+    def in_flight(self):
+        """Trabajos que empezaron y no llegaron a terminar"""
+        return {job: entry for job, entry in self.jobs.items() if entry.get('state') == STATE_STARTED}
+
+    def compact(self):
+        """Reescribe el diario con el último estado de cada trabajo si ha crecido demasiado"""
+        with self._lock:
+            if self._fd is not None or self._records <= COMPACT_RATIO * max(len(self.jobs), 1):
+                return False
+            temp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as f:
+                for entry in self.jobs.values():
+                    f.write((json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self._records = len(self.jobs)
+            return True
@@ -0,0 +1,15 @@
+import os
+
+
+def user_data_dir(*parts):
+    """Devuelve (y crea si no existe) un directorio de datos por usuario"""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+        root = os.path.join(base, 'BatchConverter')
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+        root = os.path.join(base, 'batch_converter')
+
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,163 @@
+import os
+import mmap
+import codecs
+import hashlib
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# A partir de este tamaño el archivo se lee mediante mmap
+MMAP_THRESHOLD = 1024 * 1024
+
+# Tramo que se analiza de una vez al detectar la codificación
+DETECT_CHUNK = 1024 * 1024
+
+# Página de códigos en la que cmd.exe interpreta el script (la que usaba el runtime)
+DEFAULT_CODEPAGE = 'cp437'
+
+# Línea que se antepone cuando el texto no cabe en la página de códigos de destino;
+# la variante de consola restaura al terminar la página de códigos que tenía la consola
+UTF8_PRELUDE = b'@chcp 65001 >nul\r\n'
+
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Caracteres que hay que escapar en un literal de C#: controles, comillas, barra y no ASCII
+_CS_ESCAPES = {code: f'\\u{code:04x}' for code in list(range(0x20)) + list(range(0x7f, 0x100))}
+_CS_ESCAPES.update({
+    ord('"'): '\\"',
+    ord('\\'): '\\\\',
+    ord('\r'): '\\r',
+    ord('\n'): '\\n',
+    ord('\t'): '\\t',
+})
+
+
+class BatchPayload:
+    """Bytes exactos del script tal y como se escribirán en disco en tiempo de ejecución"""
+
+    def __init__(self, data, source_encoding, target_encoding, prelude_lines=0):
+        self.data = data
+        self.source_encoding = source_encoding
+        self.target_encoding = target_encoding
+        # Líneas añadidas por el conversor antes de la primera línea del script original
+        self.prelude_lines = prelude_lines
+        self.sha256 = hashlib.sha256(data).hexdigest()
+
+    def __len__(self):
+        return len(self.data)
+
+    def lines(self):
+        """Divide el contenido en líneas conservando los saltos de línea"""
+        return self.data.splitlines(keepends=True)
+
+
+@contextmanager
+def open_source(path):
+    """Contenido del script: bytes si es pequeño o el archivo mapeado con mmap si es grande
+
+    El mapa no se copia a memoria; quien lo use debe trabajar sobre él por tramos
+    o con funciones que acepten cualquier búfer (re, str(..., encoding)).
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        if size < MMAP_THRESHOLD:
+            yield f.read()
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def normalize_newlines(data):
+    """Convierte LF y CRLF en CRLF recorriendo data (bytes o mmap) por tramos"""
+    parts = []
+    carry = b''
+    for start in range(0, len(data), DETECT_CHUNK):
+        chunk = carry + data[start:start + DETECT_CHUNK]
+        # Un CR al final del tramo puede formar un CRLF con el siguiente
+        carry = b'\r' if chunk.endswith(b'\r') else b''
+        if carry:
+            chunk = chunk[:-1]
+        parts.append(chunk.replace(b'\r\n', b'\n').replace(b'\n', b'\r\n'))
+    parts.append(carry)
+    return b''.join(parts)
+
+
+def detect_encoding(data):
+    """Detecta la codificación del script: BOM, ASCII, UTF-8 o página de códigos OEM
+
+    data puede ser bytes o un archivo mapeado: se recorre por tramos de DETECT_CHUNK
+    bytes y solo se decodifica como UTF-8 a partir del primer tramo no ASCII.
+    """
+    head = data[:4]
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+
+    decoder = None
+    for start in range(0, len(data), DETECT_CHUNK):
+        chunk = data[start:start + DETECT_CHUNK]
+        if decoder is None:
+            if chunk.isascii():
+                continue
+            decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            decoder.decode(chunk)
+        except UnicodeDecodeError:
+            # Ni ASCII ni UTF-8: ya está en una página de códigos heredada
+            return 'oem'
+    if decoder is None:
+        return 'ascii'
+    try:
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return 'oem'
+    return 'utf-8'
+
+
+def prepare_payload(path, codepage=DEFAULT_CODEPAGE):
+    """Lee el script y genera los bytes definitivos que escribirá el ejecutable
+
+    El texto se transcodifica una sola vez, en la conversión, a la página de códigos
+    de destino. Los scripts que ya están en una página OEM se embeben sin tocar y,
+    si el texto no cabe en la página de destino, se embebe en UTF-8 precedido de
+    'chcp 65001'.
+    """
+    prelude_lines = 0
+    with open_source(path) as raw:
+        source_encoding = detect_encoding(raw)
+        source_size = len(raw)
+
+        if source_encoding in ('ascii', 'oem'):
+            # La única copia es la que produce la normalización de saltos de línea
+            data = raw
+            target_encoding = 'ascii' if source_encoding == 'ascii' else 'oem'
+        else:
+            text = str(raw, source_encoding)
+            try:
+                data = text.encode(codepage)
+                target_encoding = codepage
+            except UnicodeEncodeError:
+                logger.warning("El script contiene caracteres fuera de %s; se embebe en UTF-8", codepage)
+                data = UTF8_PRELUDE + text.encode('utf-8')
+                target_encoding = 'utf-8'
+                prelude_lines = 1
+            del text
+
+        # cmd.exe requiere saltos de línea CRLF para que las etiquetas funcionen bien
+        data = normalize_newlines(data)
+
+    logger.info("Script leído: %d bytes, codificación %s -> %s", source_size, source_encoding, target_encoding)
+    return BatchPayload(data, source_encoding, target_encoding, prelude_lines)
+
+
+def cs_literal_lines(data):
+    """Convierte los bytes en fragmentos de literal C# (un byte por carácter), uno por línea"""
+    fragments = []
+    for line in data.splitlines(keepends=True):
+        fragments.append('"' + line.decode('latin-1').translate(_CS_ESCAPES) + '"')
+    return fragments or ['""']
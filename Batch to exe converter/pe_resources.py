@@ -0,0 +1,764 @@
+import os
+import sys
+import struct
+import hashlib
+import logging
+import argparse
+
+from icons import IconError, parse_ico
+
+logger = logging.getLogger(__name__)
+
+# Tipos de recurso de Windows
+RT_ICON = 3
+RT_GROUP_ICON = 14
+RT_VERSION = 16
+RT_MANIFEST = 24
+
+# Identificadores que usa csc para el icono principal y el manifiesto
+DEFAULT_ICON_GROUP_ID = 32512
+MANIFEST_ID = 1
+LANG_NEUTRAL = 0
+
+# Índices del directorio de datos del encabezado opcional
+DIR_SECURITY = 4
+DIR_RESOURCE = 2
+DIR_BASERELOC = 5
+DIR_DEBUG = 6
+DIR_COM_DESCRIPTOR = 14
+
+# Entradas del directorio de depuración
+DEBUG_ENTRY_SIZE = 28
+DEBUG_TYPE_CODEVIEW = 2
+
+IMAGE_SCN_CNT_INITIALIZED_DATA = 0x00000040
+
+EXECUTION_LEVELS = ('asInvoker', 'highestAvailable', 'requireAdministrator')
+
+
+class PEError(ValueError):
+    """El archivo no es un PE válido o no se puede modificar"""
+
+
+def align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def pe_checksum(data, checksum_offset):
+    """Calcula el checksum del encabezado opcional (algoritmo de CheckSumMappedFile)"""
+    length = len(data)
+    data = bytes(data[:checksum_offset]) + b'\0\0\0\0' + bytes(data[checksum_offset + 4:])
+    if length % 2:
+        data += b'\0'
+    # Suma de palabras de 16 bits con el acarreo plegado, más la longitud del archivo
+    total = sum(struct.unpack(f'<{len(data) // 2}H', data))
+    while total > 0xFFFF:
+        total = (total & 0xFFFF) + (total >> 16)
+    return (total + length) & 0xFFFFFFFF
+
+
+def build_manifest(level='asInvoker'):
+    """Manifiesto de aplicación con el nivel de ejecución indicado"""
+    if level not in EXECUTION_LEVELS:
+        raise ValueError(f"Nivel de ejecución no válido: {level}")
+    return f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+    <assembly xmlns="urn:schemas-microsoft-com:asm.v1" manifestVersion="1.0">
+        <assemblyIdentity version="1.0.0.0" name="MyApplication.app"/>
+        <trustInfo xmlns="urn:schemas-microsoft-com:asm.v2">
+            <security>
+                <requestedPrivileges xmlns="urn:schemas-microsoft-com:asm.v3">
+                    <requestedExecutionLevel level="{level}" uiAccess="false"/>
+                </requestedPrivileges>
+            </security>
+        </trustInfo>
+    </assembly>'''
+
+
+class Section:
+    """Encabezado de una sección del PE"""
+
+    FORMAT = '<8sIIIIIIHHI'
+    SIZE = 40
+
+    def __init__(self, raw):
+        (self.name, self.virtual_size, self.virtual_address, self.raw_size, self.raw_pointer,
+         self.relocations_pointer, self.line_numbers_pointer, self.relocations_count,
+         self.line_numbers_count, self.characteristics) = struct.unpack(self.FORMAT, raw)
+
+    def pack(self):
+        return struct.pack(
+            self.FORMAT, self.name, self.virtual_size, self.virtual_address, self.raw_size,
+            self.raw_pointer, self.relocations_pointer, self.line_numbers_pointer,
+            self.relocations_count, self.line_numbers_count, self.characteristics
+        )
+
+    @property
+    def label(self):
+        return self.name.rstrip(b'\0').decode('ascii', 'replace')
+
+    def contains_rva(self, rva):
+        return self.virtual_address <= rva < self.virtual_address + max(self.virtual_size, self.raw_size)
+
+
+class ResourceData:
+    """Contenido de un recurso (hoja del árbol de recursos)"""
+
+    def __init__(self, data, codepage=0):
+        self.data = bytes(data)
+        self.codepage = codepage
+
+
+class PEFile:
+    """Lectura y reescritura de la sección de recursos de un ejecutable PE"""
+
+    def __init__(self, data):
+        self.data = bytearray(data)
+        self._parse_headers()
+        self.resources = self._parse_resources()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    # --- Encabezados -------------------------------------------------------------------
+
+    def _parse_headers(self):
+        data = self.data
+        if len(data) < 64 or data[:2] != b'MZ':
+            raise PEError("El archivo no es un ejecutable (falta la firma MZ)")
+
+        self.pe_offset = struct.unpack_from('<I', data, 0x3C)[0]
+        if data[self.pe_offset:self.pe_offset + 4] != b'PE\0\0':
+            raise PEError("El archivo no es un ejecutable PE")
+
+        coff = self.pe_offset + 4
+        (_, self.section_count, _, _, _, optional_size, _) = struct.unpack_from('<HHIIIHH', data, coff)
+        self.optional_offset = coff + 20
+        magic = struct.unpack_from('<H', data, self.optional_offset)[0]
+        if magic == 0x10B:
+            directories_offset = 96
+        elif magic == 0x20B:
+            directories_offset = 112
+        else:
+            raise PEError(f"Encabezado opcional desconocido: 0x{magic:x}")
+
+        self.section_alignment, self.file_alignment = struct.unpack_from('<II', data, self.optional_offset + 32)
+        self.checksum_offset = self.optional_offset + 64
+        self.directory_count = struct.unpack_from('<I', data, self.optional_offset + directories_offset - 4)[0]
+        self.directories_offset = self.optional_offset + directories_offset
+
+        section_table = self.optional_offset + optional_size
+        self.sections = [
+            Section(bytes(data[section_table + index * Section.SIZE:section_table + (index + 1) * Section.SIZE]))
+            for index in range(self.section_count)
+        ]
+        self.section_table_offset = section_table
+
+    def directory(self, index):
+        if index >= self.directory_count:
+            return 0, 0
+        return struct.unpack_from('<II', self.data, self.directories_offset + index * 8)
+
+    def set_directory(self, index, rva, size):
+        struct.pack_into('<II', self.data, self.directories_offset + index * 8, rva, size)
+
+    def section_for_rva(self, rva):
+        for section in self.sections:
+            if section.contains_rva(rva):
+                return section
+        raise PEError(f"RVA fuera de las secciones: 0x{rva:x}")
+
+    def rva_to_offset(self, rva):
+        section = self.section_for_rva(rva)
+        return rva - section.virtual_address + section.raw_pointer
+
+    @property
+    def checksum(self):
+        return struct.unpack_from('<I', self.data, self.checksum_offset)[0]
+
+    def computed_checksum(self):
+        return pe_checksum(self.data, self.checksum_offset)
+
+    # --- Árbol de recursos -------------------------------------------------------------
+
+    def _parse_resources(self):
+        rva, size = self.directory(DIR_RESOURCE)
+        if not rva:
+            raise PEError("El ejecutable no tiene sección de recursos")
+        self.resource_section = self.section_for_rva(rva)
+        base = self.rva_to_offset(rva)
+        return self._parse_directory(base, base, depth=0)
+
+    def _read_name(self, base, offset):
+        length = struct.unpack_from('<H', self.data, base + offset)[0]
+        start = base + offset + 2
+        return bytes(self.data[start:start + length * 2]).decode('utf-16-le')
+
+    def _parse_directory(self, base, offset, depth):
+        if depth > 2:
+            raise PEError("Árbol de recursos demasiado profundo")
+        named, numbered = struct.unpack_from('<HH', self.data, offset + 12)
+        result = {}
+        for index in range(named + numbered):
+            name, target = struct.unpack_from('<II', self.data, offset + 16 + index * 8)
+            key = self._read_name(base, name & 0x7FFFFFFF) if name & 0x80000000 else name
+            if target & 0x80000000:
+                result[key] = self._parse_directory(base, base + (target & 0x7FFFFFFF), depth + 1)
+            else:
+                data_rva, data_size, codepage, _ = struct.unpack_from('<IIII', self.data, base + target)
+                start = self.rva_to_offset(data_rva)
+                result[key] = ResourceData(self.data[start:start + data_size], codepage)
+        return result
+
+    @staticmethod
+    def _sorted_entries(directory):
+        # Primero las entradas con nombre (ordenadas) y después las numéricas en orden ascendente
+        named = sorted((key for key in directory if isinstance(key, str)), key=str.upper)
+        numbered = sorted(key for key in directory if not isinstance(key, str))
+        return named, numbered
+
+    def build_resource_section(self, section_rva):
+        """Serializa el árbol de recursos para una sección que empieza en section_rva"""
+        # Primera pasada: recorrer el árbol en anchura para asignar posiciones
+        directories = []
+        leaves = []
+        strings = {}
+        queue = [self.resources]
+        while queue:
+            directory = queue.pop(0)
+            directories.append(directory)
+            named, numbered = self._sorted_entries(directory)
+            for key in named + numbered:
+                if isinstance(key, str):
+                    strings.setdefault(key, None)
+                child = directory[key]
+                if isinstance(child, dict):
+                    queue.append(child)
+                else:
+                    leaves.append(child)
+
+        directory_offsets = {}
+        offset = 0
+        for directory in directories:
+            directory_offsets[id(directory)] = offset
+            offset += 16 + 8 * len(directory)
+
+        leaf_offsets = {}
+        for leaf in leaves:
+            leaf_offsets[id(leaf)] = offset
+            offset += 16
+
+        for name in strings:
+            strings[name] = offset
+            offset += 2 + 2 * len(name)
+
+        data_offsets = {}
+        for leaf in leaves:
+            offset = align(offset, 8)
+            data_offsets[id(leaf)] = offset
+            offset += len(leaf.data)
+
+        # Segunda pasada: escribir las estructuras
+        output = bytearray(align(offset, 8))
+        for directory in directories:
+            position = directory_offsets[id(directory)]
+            named, numbered = self._sorted_entries(directory)
+            struct.pack_into('<IIHHHH', output, position, 0, 0, 4, 0, len(named), len(numbered))
+            for index, key in enumerate(named + numbered):
+                name_field = (strings[key] | 0x80000000) if isinstance(key, str) else key
+                child = directory[key]
+                if isinstance(child, dict):
+                    target = directory_offsets[id(child)] | 0x80000000
+                else:
+                    target = leaf_offsets[id(child)]
+                struct.pack_into('<II', output, position + 16 + index * 8, name_field, target)
+
+        for leaf in leaves:
+            struct.pack_into('<IIII', output, leaf_offsets[id(leaf)],
+                             section_rva + data_offsets[id(leaf)], len(leaf.data), leaf.codepage, 0)
+            output[data_offsets[id(leaf)]:data_offsets[id(leaf)] + len(leaf.data)] = leaf.data
+
+        for name, position in strings.items():
+            encoded = name.encode('utf-16-le')
+            struct.pack_into('<H', output, position, len(name))
+            output[position + 2:position + 2 + len(encoded)] = encoded
+
+        return bytes(output)
+
+    # --- Modificación de recursos ------------------------------------------------------
+
+    def _languages(self, resource_type):
+        languages = set()
+        for entries in self.resources.get(resource_type, {}).values():
+            languages.update(entries)
+        return languages
+
+    def set_resource(self, resource_type, name, data, language=None, codepage=0):
+        """Sustituye (o añade) un recurso conservando su idioma si ya existía"""
+        entries = self.resources.setdefault(resource_type, {}).setdefault(name, {})
+        if language is None:
+            language = next(iter(entries), LANG_NEUTRAL)
+        entries.clear()
+        entries[language] = ResourceData(data, codepage)
+
+    def set_manifest(self, manifest):
+        """Sustituye el manifiesto de la aplicación"""
+        if isinstance(manifest, str):
+            manifest = manifest.encode('utf-8')
+        self.set_resource(RT_MANIFEST, MANIFEST_ID, manifest)
+
+    def set_icon(self, ico_data):
+        """Sustituye el grupo de iconos principal por el contenido de un archivo ICO"""
+        images = parse_ico(ico_data)
+        named, numbered = self._sorted_entries(self.resources.get(RT_GROUP_ICON, {}))
+        group_name = (numbered + named or [DEFAULT_ICON_GROUP_ID])[0]
+        languages = self._languages(RT_GROUP_ICON) | self._languages(RT_ICON)
+        language = min(languages) if languages else LANG_NEUTRAL
+
+        self.resources.pop(RT_ICON, None)
+        self.resources.pop(RT_GROUP_ICON, None)
+
+        icons = {}
+        group = struct.pack('<HHH', 0, 1, len(images))
+        for icon_id, image in enumerate(images, start=1):
+            icons[icon_id] = {language: ResourceData(image.data)}
+            color_count = 0 if image.bit_count >= 8 else 1 << image.bit_count
+            group += struct.pack(
+                '<BBBBHHIH',
+                image.width if image.width < 256 else 0,
+                image.height if image.height < 256 else 0,
+                color_count, 0, 1, image.bit_count, len(image.data), icon_id
+            )
+        self.resources[RT_ICON] = icons
+        self.resources[RT_GROUP_ICON] = {group_name: {language: ResourceData(group)}}
+
+    def version_info(self):
+        """Lee la información de versión existente (o None)"""
+        for entries in self.resources.get(RT_VERSION, {}).values():
+            for resource in entries.values():
+                return parse_version_info(resource.data)
+        return None
+
+    def set_version_info(self, file_version=None, product_version=None, strings=None):
+        """Actualiza la información de versión conservando los valores que no se cambian"""
+        current = self.version_info() or {'file_version': '0.0.0.0', 'product_version': '0.0.0.0', 'strings': {}}
+        merged_strings = dict(current['strings'])
+        merged_strings.update(strings or {})
+        file_version = file_version or current['file_version']
+        product_version = product_version or current['product_version']
+        if file_version:
+            merged_strings['FileVersion'] = file_version
+            merged_strings.setdefault('Assembly Version', file_version)
+        if product_version:
+            merged_strings['ProductVersion'] = product_version
+        versions = self.resources.get(RT_VERSION, {})
+        name = next(iter(versions), 1)
+        self.set_resource(RT_VERSION, name, build_version_info(file_version, product_version, merged_strings))
+
+    # --- Escritura ---------------------------------------------------------------------
+
+    def build(self):
+        """Genera el ejecutable con la sección de recursos reconstruida y el checksum actualizado"""
+        security_rva, security_size = self.directory(DIR_SECURITY)
+        if security_rva or security_size:
+            raise PEError("El ejecutable está firmado; modificarlo invalidaría la firma")
+
+        sections = sorted(self.sections, key=lambda section: section.raw_pointer or 0)
+        resource = self.resource_section
+        resource_index = sections.index(resource)
+        new_resources = self.build_resource_section(resource.virtual_address)
+
+        old_raw_end = resource.raw_pointer + resource.raw_size
+        new_raw_size = align(len(new_resources), self.file_alignment)
+        raw_delta = new_raw_size - resource.raw_size
+
+        # Si la sección crece más allá de su espacio virtual, las siguientes se desplazan
+        new_virtual_end = align(resource.virtual_address + len(new_resources), self.section_alignment)
+        following = sorted(
+            (section for section in self.sections if section.virtual_address > resource.virtual_address),
+            key=lambda section: section.virtual_address
+        )
+        virtual_delta = 0
+        if following and new_virtual_end > following[0].virtual_address:
+            virtual_delta = new_virtual_end - following[0].virtual_address
+
+        if virtual_delta:
+            self._check_relocatable(following)
+
+        output = bytearray(self.data[:resource.raw_pointer])
+        output += new_resources + b'\0' * (new_raw_size - len(new_resources))
+        output += self.data[old_raw_end:]
+        # Los encabezados no cambian de posición: se actualizan directamente en el nuevo archivo
+        self.data = output
+
+        resource.virtual_size = len(new_resources)
+        resource.raw_size = new_raw_size
+        for section in sections[resource_index + 1:]:
+            if section.raw_pointer:
+                section.raw_pointer += raw_delta
+
+        if virtual_delta:
+            for index in range(min(self.directory_count, 16)):
+                if index in (DIR_RESOURCE, DIR_SECURITY):
+                    continue
+                rva, size = self.directory(index)
+                if rva and any(section.contains_rva(rva) for section in following):
+                    self.set_directory(index, rva + virtual_delta, size)
+            for section in following:
+                section.virtual_address += virtual_delta
+
+        self._fix_debug_directory(old_raw_end, raw_delta)
+        self.set_directory(DIR_RESOURCE, resource.virtual_address, len(new_resources))
+
+        for index, section in enumerate(self.sections):
+            start = self.section_table_offset + index * Section.SIZE
+            self.data[start:start + Section.SIZE] = section.pack()
+
+        last = max(self.sections, key=lambda section: section.virtual_address)
+        size_of_image = align(last.virtual_address + max(last.virtual_size, 1), self.section_alignment)
+        initialized = sum(section.raw_size for section in self.sections
+                          if section.characteristics & IMAGE_SCN_CNT_INITIALIZED_DATA)
+        struct.pack_into('<I', self.data, self.optional_offset + 56, size_of_image)
+        struct.pack_into('<I', self.data, self.optional_offset + 8, initialized)
+        struct.pack_into('<I', self.data, self.checksum_offset, pe_checksum(self.data, self.checksum_offset))
+
+        # Volver a leer la estructura para que el objeto refleje el archivo generado
+        self._parse_headers()
+        self.resources = self._parse_resources()
+        return bytes(self.data)
+
+    def _check_relocatable(self, sections):
+        """Solo se pueden desplazar secciones sin referencias desde el código (p. ej. .reloc)"""
+        for section in sections:
+            for index in range(min(self.directory_count, 16)):
+                if index in (DIR_BASERELOC, DIR_RESOURCE, DIR_SECURITY):
+                    continue
+                rva, _ = self.directory(index)
+                if rva and section.contains_rva(rva):
+                    raise PEError(f"No se puede desplazar la sección {section.label}: contiene datos referenciados")
+            if section.label != '.reloc':
+                raise PEError(f"No se puede desplazar la sección {section.label} para ampliar los recursos")
+
+    def _fix_debug_directory(self, old_raw_end, raw_delta):
+        """Actualiza los punteros de archivo del directorio de depuración tras el desplazamiento"""
+        rva, size = self.directory(DIR_DEBUG)
+        if not rva or not raw_delta:
+            return
+        # Las secciones ya están actualizadas: el desplazamiento obtenido es el del nuevo archivo
+        offset = self.rva_to_offset(rva)
+        for entry in range(size // DEBUG_ENTRY_SIZE):
+            pointer_offset = offset + entry * 28 + 24
+            pointer = struct.unpack_from('<I', self.data, pointer_offset)[0]
+            if pointer >= old_raw_end:
+                struct.pack_into('<I', self.data, pointer_offset, pointer + raw_delta)
+
+    def save(self, path):
+        data = self.build()
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+
+# --- VS_VERSIONINFO -----------------------------------------------------------------------
+
+def _parse_version(text):
+    parts = [int(part) for part in str(text).split('.')[:4]]
+    parts += [0] * (4 - len(parts))
+    if any(part < 0 or part > 0xFFFF for part in parts):
+        raise ValueError(f"Versión no válida: {text}")
+    return parts
+
+
+def _version_node(key, value=b'', children=b'', value_type=0, value_length=None):
+    """Nodo genérico de VS_VERSIONINFO: longitud, longitud del valor, tipo, clave, valor e hijos"""
+    encoded_key = key.encode('utf-16-le') + b'\0\0'
+    header_size = 6 + len(encoded_key)
+    body = b'\0' * (align(header_size, 4) - header_size) + value
+    if children:
+        body += b'\0' * (align(header_size + len(body), 4) - header_size - len(body)) + children
+    if value_length is None:
+        value_length = len(value) // 2 if value_type == 1 else len(value)
+    node = struct.pack('<HHH', header_size + len(body), value_length, value_type) + encoded_key + body
+    return node + b'\0' * (align(len(node), 4) - len(node))
+
+
+def build_version_info(file_version, product_version, strings, language=0x0409, codepage=1200):
+    """Construye el recurso RT_VERSION (VS_VERSIONINFO)"""
+    file_parts = _parse_version(file_version)
+    product_parts = _parse_version(product_version)
+    fixed = struct.pack(
+        '<13I',
+        0xFEEF04BD, 0x00010000,
+        (file_parts[0] << 16) | file_parts[1], (file_parts[2] << 16) | file_parts[3],
+        (product_parts[0] << 16) | product_parts[1], (product_parts[2] << 16) | product_parts[3],
+        0x3F, 0, 0x4, 0x1, 0, 0, 0
+    )
+
+    string_nodes = b''.join(
+        _version_node(name, str(value).encode('utf-16-le') + b'\0\0', value_type=1)
+        for name, value in strings.items()
+    )
+    table = _version_node(f'{language:04x}{codepage:04x}', children=string_nodes, value_type=1)
+    string_file_info = _version_node('StringFileInfo', children=table, value_type=1)
+    translation = _version_node('Translation', struct.pack('<HH', language, codepage))
+    var_file_info = _version_node('VarFileInfo', children=translation, value_type=1)
+    return _version_node('VS_VERSION_INFO', fixed, string_file_info + var_file_info)
+
+
+def _parse_version_node(data, offset):
+    length, value_length, value_type = struct.unpack_from('<HHH', data, offset)
+    end = offset + length
+    key_start = offset + 6
+    key_end = key_start
+    while data[key_end:key_end + 2] != b'\0\0':
+        key_end += 2
+    key = data[key_start:key_end].decode('utf-16-le')
+    value_start = align(key_end + 2 - offset, 4) + offset
+    value_size = value_length * 2 if value_type == 1 else value_length
+    value = data[value_start:value_start + value_size]
+    children = []
+    child = align(value_start + value_size - offset, 4) + offset
+    while child + 6 <= end:
+        child_length = struct.unpack_from('<H', data, child)[0]
+        if child_length == 0:
+            break
+        children.append(_parse_version_node(data, child))
+        child = align(child + child_length - offset, 4) + offset
+    return key, value_type, value, children
+
+
+def parse_version_info(data):
+    """Lee versiones y cadenas de un recurso VS_VERSIONINFO"""
+    data = bytes(data)
+    key, _, fixed, children = _parse_version_node(data, 0)
+    if key != 'VS_VERSION_INFO' or len(fixed) < 52:
+        raise PEError("Recurso de versión no válido")
+    values = struct.unpack_from('<13I', fixed)
+    file_version = '{}.{}.{}.{}'.format(values[2] >> 16, values[2] & 0xFFFF, values[3] >> 16, values[3] & 0xFFFF)
+    product_version = '{}.{}.{}.{}'.format(values[4] >> 16, values[4] & 0xFFFF, values[5] >> 16, values[5] & 0xFFFF)
+
+    strings = {}
+    for child_key, _, _, tables in children:
+        if child_key != 'StringFileInfo':
+            continue
+        for _, _, _, entries in tables:
+            for name, _, value, _ in entries:
+                strings[name] = value.decode('utf-16-le').rstrip('\0')
+    return {'file_version': file_version, 'product_version': product_version, 'strings': strings}
+
+
+# --- Normalización para compilaciones reproducibles --------------------------------------
+
+def _metadata_streams(pe):
+    """Desplazamientos y tamaños de los flujos de metadatos .NET (#~, #GUID...) del ejecutable"""
+    rva, _ = pe.directory(DIR_COM_DESCRIPTOR)
+    if not rva:
+        return {}
+    data = pe.data
+    metadata_rva = struct.unpack_from('<I', data, pe.rva_to_offset(rva) + 8)[0]
+    root = pe.rva_to_offset(metadata_rva)
+    if data[root:root + 4] != b'BSJB':
+        raise PEError("Los metadatos .NET no tienen la firma BSJB")
+
+    version_length = struct.unpack_from('<I', data, root + 12)[0]
+    position = root + 16 + version_length
+    stream_count = struct.unpack_from('<H', data, position + 2)[0]
+    position += 4
+    streams = {}
+    for _ in range(stream_count):
+        offset, size = struct.unpack_from('<II', data, position)
+        name_end = data.index(b'\0', position + 8)
+        streams[bytes(data[position + 8:name_end]).decode('ascii')] = (root + offset, size)
+        # El nombre, con su terminador, ocupa un múltiplo de 4 bytes
+        position += 8 + (name_end - position - 8 + 4) // 4 * 4
+    return streams
+
+
+def _mvid_offset(pe):
+    """Desplazamiento en el archivo del MVID del módulo, o None si no es un ensamblado .NET"""
+    streams = _metadata_streams(pe)
+    tables = streams.get('#~') or streams.get('#-')
+    if not tables or '#GUID' not in streams:
+        return None
+    data = pe.data
+    start = tables[0]
+    heap_sizes = data[start + 6]
+    valid = struct.unpack_from('<Q', data, start + 8)[0]
+    if not valid & 1:
+        return None
+
+    # Tras la cabecera van los recuentos de filas de cada tabla presente y, después, la tabla Module
+    module = start + 24 + 4 * bin(valid).count('1') + (4 if heap_sizes & 0x40 else 0)
+    string_size = 4 if heap_sizes & 0x01 else 2
+    guid_format = '<I' if heap_sizes & 0x02 else '<H'
+    guid_index = struct.unpack_from(guid_format, data, module + 2 + string_size)[0]
+    if not guid_index:
+        return None
+    return streams['#GUID'][0] + (guid_index - 1) * 16
+
+
+def normalize_pe(data):
+    """Sustituye los campos variables de una compilación por valores derivados del contenido
+
+    La marca de tiempo del encabezado y del directorio de depuración, el MVID del
+    módulo y el identificador del PDB cambian en cada compilación con csc o mcs.
+    Se anulan, se calcula el hash del resto del archivo y de él se derivan los
+    nuevos valores, de modo que dos compilaciones del mismo código dan el mismo
+    ejecutable. Por último se recalcula la suma de comprobación.
+    """
+    pe = PEFile(data)
+    timestamps = [pe.pe_offset + 8]
+    guids = []
+
+    rva, size = pe.directory(DIR_DEBUG)
+    if rva:
+        offset = pe.rva_to_offset(rva)
+        for entry in range(size // DEBUG_ENTRY_SIZE):
+            entry_offset = offset + entry * DEBUG_ENTRY_SIZE
+            timestamps.append(entry_offset + 4)
+            entry_type, data_size, _, pointer = struct.unpack_from('<IIII', pe.data, entry_offset + 12)
+            if entry_type == DEBUG_TYPE_CODEVIEW and data_size >= 24 and pe.data[pointer:pointer + 4] == b'RSDS':
+                guids.append(pointer + 4)
+
+    mvid_offset = _mvid_offset(pe)
+    if mvid_offset is not None:
+        guids.append(mvid_offset)
+
+    for offset in timestamps:
+        struct.pack_into('<I', pe.data, offset, 0)
+    for offset in guids:
+        pe.data[offset:offset + 16] = bytes(16)
+    struct.pack_into('<I', pe.data, pe.checksum_offset, 0)
+
+    digest = hashlib.sha256(pe.data).digest()
+    # GUID de versión 4 y marca de tiempo sin el bit alto, como hace Roslyn con /deterministic
+    guid = bytearray(digest[:16])
+    guid[7] = (guid[7] & 0x0F) | 0x40
+    guid[8] = (guid[8] & 0x3F) | 0x80
+    timestamp = struct.unpack_from('<I', digest, 16)[0] & 0x7FFFFFFF
+
+    for offset in timestamps:
+        struct.pack_into('<I', pe.data, offset, timestamp)
+    for offset in guids:
+        pe.data[offset:offset + 16] = guid
+    struct.pack_into('<I', pe.data, pe.checksum_offset, pe.computed_checksum())
+    return bytes(pe.data)
+
+
+def normalize_executable(path):
+    """Normaliza un ejecutable en su sitio; devuelve True si ha cambiado"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    normalized = normalize_pe(data)
+    if normalized == data:
+        return False
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(normalized)
+    os.replace(temp_path, path)
+    return True
+
+
+def patch_executable(path, output=None, icon=None, execution_level=None, manifest=None,
+                     file_version=None, product_version=None, strings=None):
+    """Modifica icono, manifiesto e información de versión de un ejecutable sin recompilar"""
+    pe = PEFile.load(path)
+    if icon:
+        with open(icon, 'rb') as f:
+            pe.set_icon(f.read())
+    if manifest:
+        pe.set_manifest(manifest)
+    elif execution_level:
+        pe.set_manifest(build_manifest(execution_level))
+    if file_version or product_version or strings:
+        pe.set_version_info(file_version, product_version, strings)
+    pe.save(output or path)
+    return pe
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Modifica los recursos de un ejecutable generado')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    dump_parser = subparsers.add_parser('dump', help='Muestra los recursos del ejecutable')
+    dump_parser.add_argument('exe')
+
+    patch_parser = subparsers.add_parser('patch', help='Cambia icono, manifiesto o versión')
+    patch_parser.add_argument('exe', nargs='+')
+    patch_parser.add_argument('--output', help='Archivo de salida (solo con un ejecutable)')
+    patch_parser.add_argument('--icon', help='Archivo .ico')
+    patch_parser.add_argument('--level', choices=EXECUTION_LEVELS, help='Nivel de ejecución del manifiesto')
+    patch_parser.add_argument('--manifest', help='Archivo de manifiesto completo')
+    patch_parser.add_argument('--file-version')
+    patch_parser.add_argument('--product-version')
+    patch_parser.add_argument('--set', action='append', default=[], metavar='CLAVE=VALOR',
+                              help='Cadena de la información de versión (p. ej. CompanyName=ACME)')
+
+    normalize_parser = subparsers.add_parser('normalize', help='Fija marcas de tiempo y GUID para comparar compilaciones')
+    normalize_parser.add_argument('exe', nargs='+')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'normalize':
+        for exe in args.exe:
+            changed = normalize_executable(exe)
+            print(f"{'Normalizado' if changed else 'Sin cambios'}: {exe}")
+        return 0
+
+    if args.command == 'dump':
+        pe = PEFile.load(args.exe)
+        print(f"Checksum: 0x{pe.checksum:08x} (calculado 0x{pe.computed_checksum():08x})")
+        for resource_type, names in sorted(pe.resources.items(), key=lambda item: str(item[0])):
+            for name, languages in names.items():
+                for language, resource in languages.items():
+                    print(f"tipo={resource_type} nombre={name} idioma={language} bytes={len(resource.data)}")
+        version = pe.version_info()
+        if version:
+            print(f"Versión: {version['file_version']} / {version['product_version']}")
+            for key, value in version['strings'].items():
+                print(f"  {key}: {value}")
+        return 0
+
+    if args.output and len(args.exe) > 1:
+        parser.error('--output solo se puede usar con un único ejecutable')
+
+    invalid = [item for item in args.set if '=' not in item]
+    if invalid:
+        parser.error(f"--set espera CLAVE=VALOR: {', '.join(invalid)}")
+    strings = dict(item.split('=', 1) for item in args.set)
+    for option, version in (('--file-version', args.file_version), ('--product-version', args.product_version)):
+        if version is not None:
+            try:
+                _parse_version(version)
+            except ValueError:
+                parser.error(f"{option} no es una versión válida: {version}")
+
+    manifest = None
+    if args.manifest:
+        try:
+            with open(args.manifest, 'rb') as f:
+                manifest = f.read()
+        except OSError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+
+    # Un ejecutable dañado no detiene el resto del lote
+    failed = 0
+    for exe in args.exe:
+        try:
+            patch_executable(
+                exe, args.output, icon=args.icon, execution_level=args.level, manifest=manifest,
+                file_version=args.file_version, product_version=args.product_version, strings=strings
+            )
+        except (PEError, IconError, OSError) as e:
+            print(f"Error en {exe}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        print(f"Actualizado: {args.output or exe}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+import os
+import codecs
+
+from compilers import BACKENDS, PLATFORMS
+from icons import IconError, validate_icon
+from assets import AssetError, collect_assets
+
+# Extensiones de script aceptadas
+BATCH_EXTENSIONS = ('.bat', '.cmd')
+
+# El payload se guarda como literal en el heap #US del ensamblado, limitado a 16 MB
+# y codificado en UTF-16: por encima de este tamaño el compilador falla (CS8103)
+MAX_PAYLOAD_BYTES = 8 * 1024 * 1024
+
+# Bytes de origen por byte de payload en el peor caso (UTF-8 de 3 bytes a un carácter OEM):
+# el tamaño exacto se comprueba tras preparar el payload, aquí solo se descartan los que no caben seguro
+MIN_PAYLOAD_RATIO = 3
+
+# Los recursos embebidos se cargan en memoria con el ensamblado
+MAX_ASSETS_BYTES = 512 * 1024 * 1024
+
+# Bytes que se leen del principio del script para detectar archivos binarios
+SNIFF_BYTES = 8192
+
+# Claves admitidas en la matriz de variantes (en singular o plural) y su opción correspondiente
+VARIANT_KEYS = {
+    'platform': 'platform',
+    'platforms': 'platform',
+    'admin': 'admin_required',
+    'admin_required': 'admin_required',
+    'console': 'console',
+}
+
+# Caracteres no permitidos y nombres reservados en nombres de archivo de Windows
+INVALID_NAME_CHARS = set('<>:"/\\|?*') | {chr(code) for code in range(32)}
+RESERVED_NAMES = {'CON', 'PRN', 'AUX', 'NUL'} | {f'COM{i}' for i in range(1, 10)} | {f'LPT{i}' for i in range(1, 10)}
+
+# Iconos ya validados: (ruta, mtime, tamaño) -> mensaje de error o None
+_icon_results = {}
+
+
+class PreflightError(Exception):
+    """La configuración tiene uno o más problemas que impiden la conversión"""
+
+    def __init__(self, problems):
+        self.problems = list(problems)
+        super().__init__("\n".join(f"- {problem}" for problem in self.problems))
+
+
+def normalize_variant(entry):
+    """Traduce las claves de una variante o de los ejes de la matriz a las opciones de compilación"""
+    normalized = {}
+    for key, value in entry.items():
+        if key not in VARIANT_KEYS:
+            raise ValueError(
+                f"Clave desconocida en la matriz: {key} (se admiten {', '.join(sorted(VARIANT_KEYS))})"
+            )
+        option = VARIANT_KEYS[key]
+        if option in normalized:
+            raise ValueError(f"La matriz repite la opción {option} con otro nombre")
+        normalized[option] = value
+    return normalized
+
+
+def normalize_axes(matrix):
+    """Ejes de la matriz en forma de diccionario, con un valor suelto convertido en lista"""
+    axes = {}
+    for option, values in normalize_variant(matrix).items():
+        if isinstance(values, (str, bool, int)):
+            values = [values]
+        elif isinstance(values, (list, tuple)):
+            values = list(values)
+        else:
+            raise ValueError(f"La matriz espera un valor o una lista de valores para {option}")
+        if not values:
+            raise ValueError(f"La matriz no tiene ningún valor para {option}")
+        axes[option] = values
+    return axes
+
+
+def _check_batch_file(config, problems):
+    batch_file = config.get('batch_file')
+    if not batch_file:
+        problems.append("No se seleccionó ningún archivo batch")
+        return
+
+    try:
+        stat = os.stat(batch_file)
+    except OSError:
+        problems.append(f"No se encuentra el archivo batch: {batch_file}")
+        return
+
+    if not os.path.isfile(batch_file):
+        problems.append(f"La ruta del script no es un archivo: {batch_file}")
+        return
+
+    if not batch_file.lower().endswith(BATCH_EXTENSIONS):
+        problems.append(f"Extensión no válida (se espera .bat o .cmd): {os.path.basename(batch_file)}")
+
+    if stat.st_size == 0:
+        problems.append("El archivo batch está vacío")
+        return
+
+    max_payload = config.get('max_payload_bytes', MAX_PAYLOAD_BYTES)
+    if stat.st_size // MIN_PAYLOAD_RATIO > max_payload:
+        problems.append(
+            f"El script ocupa {stat.st_size} bytes y supera el límite del literal embebido ({max_payload} bytes)"
+        )
+
+    try:
+        with open(batch_file, 'rb') as f:
+            head = f.read(SNIFF_BYTES)
+    except OSError as e:
+        problems.append(f"No se puede leer el archivo batch: {e}")
+        return
+
+    # Los bytes nulos indican un archivo binario, salvo en texto UTF-16 con BOM
+    is_utf16 = head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE))
+    if b'\0' in head and not is_utf16:
+        problems.append("El archivo batch parece binario (contiene bytes nulos)")
+    elif not head.strip():
+        problems.append("El archivo batch solo contiene espacios en blanco")
+
+
+def _check_output(config, problems):
+    output_name = (config.get('output_name') or '').strip()
+    if not output_name:
+        problems.append("Debe ingresar un nombre para el ejecutable")
+    else:
+        invalid = sorted(set(output_name) & INVALID_NAME_CHARS)
+        if invalid:
+            problems.append(f"El nombre del ejecutable contiene caracteres no válidos: {' '.join(invalid)}")
+        if output_name.split('.')[0].upper() in RESERVED_NAMES:
+            problems.append(f"El nombre del ejecutable está reservado por Windows: {output_name}")
+        if output_name.endswith(('.', ' ')):
+            problems.append("El nombre del ejecutable no puede terminar en punto o espacio")
+
+    output_dir = os.path.abspath(config.get('output_dir') or 'dist')
+
+    # Si la carpeta no existe se comprueba el primer directorio existente, donde se creará
+    existing = output_dir
+    while not os.path.exists(existing):
+        parent = os.path.dirname(existing)
+        if parent == existing:
+            break
+        existing = parent
+
+    if not os.path.isdir(existing):
+        problems.append(f"La ruta de salida no es una carpeta: {existing}")
+    elif not os.access(existing, os.W_OK | os.X_OK):
+        problems.append(f"No hay permisos de escritura en el directorio de salida: {existing}")
+    elif output_name and existing == output_dir:
+        output_exe = os.path.join(output_dir, output_name + '.exe')
+        if os.path.exists(output_exe) and not os.access(output_exe, os.W_OK):
+            problems.append(f"No se puede sobrescribir el ejecutable existente: {output_exe}")
+
+
+def _check_icon(config, problems):
+    icon_file = config.get('icon_file')
+    if not icon_file:
+        return
+
+    try:
+        stat = os.stat(icon_file)
+    except OSError:
+        problems.append(f"No se encuentra el icono: {icon_file}")
+        return
+
+    key = (os.path.abspath(icon_file), stat.st_mtime_ns, stat.st_size)
+    if key not in _icon_results:
+        try:
+            validate_icon(icon_file)
+            _icon_results[key] = None
+        except (IconError, OSError) as e:
+            _icon_results[key] = f"Icono no válido ({os.path.basename(icon_file)}): {e}"
+
+    if _icon_results[key]:
+        problems.append(_icon_results[key])
+
+
+def _check_assets(config, problems):
+    assets = config.get('assets')
+    if not assets:
+        return
+    try:
+        collected = collect_assets(assets)
+    except (AssetError, OSError) as e:
+        problems.append(str(e))
+        return
+
+    max_assets = config.get('max_assets_bytes', MAX_ASSETS_BYTES)
+    total = sum(os.path.getsize(path) for _, path in collected)
+    if total > max_assets:
+        problems.append(f"Los archivos adicionales ocupan {total} bytes y superan el límite de {max_assets} bytes")
+
+
+def _check_options(config, problems):
+    compiler = config.get('compiler', 'auto')
+    names = [backend_class.name for backend_class in BACKENDS]
+    if compiler and compiler != 'auto' and compiler not in names:
+        problems.append(f"Compilador desconocido: {compiler}")
+
+    platforms = [config.get('platform', 'anycpu')]
+    matrix = config.get('matrix')
+    try:
+        if isinstance(matrix, dict):
+            platforms.extend(normalize_axes(matrix).get('platform', []))
+        elif matrix:
+            platforms.extend(normalize_variant(entry).get('platform', 'anycpu') for entry in matrix)
+    except ValueError as e:
+        problems.append(str(e))
+    for platform in sorted(set(platforms) - set(PLATFORMS)):
+        problems.append(f"Plataforma no soportada: {platform}")
+
+
+def check_payload_size(payload, config):
+    """Comprueba el tamaño exacto del payload (CRLF, transcodificación y chcp incluidos)"""
+    max_payload = config.get('max_payload_bytes', MAX_PAYLOAD_BYTES)
+    if len(payload) > max_payload:
+        raise PreflightError([
+            f"El script genera {len(payload)} bytes embebidos y supera el límite del literal ({max_payload} bytes)"
+        ])
+
+
+def run_preflight(config):
+    """Valida la configuración de un trabajo sin ejecutar nada y devuelve todos los problemas"""
+    problems = []
+    _check_batch_file(config, problems)
+    _check_output(config, problems)
+    _check_icon(config, problems)
+    _check_assets(config, problems)
+    _check_options(config, problems)
+    return problems
+
+
+def check_preflight(config):
+    """Lanza PreflightError con todos los problemas encontrados, si los hay"""
+    problems = run_preflight(config)
+    if problems:
+        raise PreflightError(problems)
@@ -0,0 +1,269 @@
+import os
+import mmap
+from array import array
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt, QThread, pyqtSignal
+from PyQt6.QtGui import QColor, QFont
+from PyQt6.QtWidgets import QLabel, QListView, QVBoxLayout, QWidget
+
+from payload import detect_encoding
+
+# Líneas que se indexan antes de enviar un bloque a la vista
+BATCH_LINES = 65536
+
+# Bytes del principio del archivo que se usan para detectar la codificación
+ENCODING_SNIFF_BYTES = 65536
+
+# Filas que la vista distribuye en cada pasada (mantiene la interfaz fluida con millones de líneas)
+LAYOUT_BATCH_SIZE = 200
+
+# Las líneas más largas se recortan al mostrarlas
+MAX_DISPLAY_CHARS = 500
+
+# Clases de línea para el resaltado
+LINE_PLAIN = 0
+LINE_COMMENT = 1
+LINE_LABEL = 2
+LINE_ECHO = 3
+LINE_CONTROL = 4
+LINE_BLANK = 5
+
+CONTROL_KEYWORDS = (
+    b'if', b'for', b'goto', b'call', b'exit', b'set', b'setlocal', b'endlocal', b'shift', b'pushd', b'popd'
+)
+
+LINE_COLORS = {
+    LINE_COMMENT: QColor('#6a9955'),
+    LINE_LABEL: QColor('#c586c0'),
+    LINE_ECHO: QColor('#ce9178'),
+    LINE_CONTROL: QColor('#569cd6'),
+}
+
+
+def classify_line(line):
+    """Clasifica una línea de un script batch para el resaltado"""
+    stripped = line.strip().lstrip(b'@').lower()
+    if not stripped:
+        return LINE_BLANK
+    if stripped.startswith(b'::'):
+        return LINE_COMMENT
+    if stripped.startswith(b':'):
+        return LINE_LABEL
+    word = stripped.split(None, 1)[0]
+    if word == b'rem':
+        return LINE_COMMENT
+    if word.startswith(b'echo'):
+        return LINE_ECHO
+    if word in CONTROL_KEYWORDS:
+        return LINE_CONTROL
+    return LINE_PLAIN
+
+
+class LineIndexer(QThread):
+    """Indexa en segundo plano el inicio de cada línea, su clase y las estadísticas del script"""
+
+    # Desplazamientos de inicio y clases de un bloque de líneas
+    lines_indexed = pyqtSignal(object, object)
+    stats_ready = pyqtSignal(dict)
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+
+    def run(self):
+        stats = {'size': 0, 'lines': 0, 'blank': 0, 'comments': 0, 'labels': 0, 'longest': 0, 'encoding': None}
+        try:
+            stats['size'] = os.path.getsize(self.path)
+            if stats['size'] == 0:
+                return
+            with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                stats['encoding'] = detect_encoding(mapped[:ENCODING_SNIFF_BYTES])
+                if stats['encoding'] == 'utf-16':
+                    # Los saltos de línea de UTF-16 no se pueden indexar byte a byte
+                    return
+                self._index(mapped, stats)
+        except OSError as e:
+            stats['error'] = str(e)
+        finally:
+            if not self.isInterruptionRequested():
+                self.stats_ready.emit(stats)
+
+    def _index(self, mapped, stats):
+        size = len(mapped)
+        offsets = array('Q')
+        classes = bytearray()
+        start = 0
+        while start < size:
+            if self.isInterruptionRequested():
+                return
+            end = mapped.find(b'\n', start)
+            if end < 0:
+                end = size
+            line = mapped[start:end]
+            line_class = classify_line(line)
+
+            offsets.append(start)
+            classes.append(line_class)
+            stats['longest'] = max(stats['longest'], len(line) - line.endswith(b'\r'))
+            if line_class == LINE_BLANK:
+                stats['blank'] += 1
+            elif line_class == LINE_COMMENT:
+                stats['comments'] += 1
+            elif line_class == LINE_LABEL:
+                stats['labels'] += 1
+
+            if len(offsets) == BATCH_LINES:
+                stats['lines'] += len(offsets)
+                self.lines_indexed.emit(offsets, bytes(classes))
+                offsets = array('Q')
+                classes = bytearray()
+            start = end + 1
+
+        if offsets:
+            stats['lines'] += len(offsets)
+            self.lines_indexed.emit(offsets, bytes(classes))
+
+
+class ScriptPreviewModel(QAbstractListModel):
+    """Modelo de solo lectura que decodifica bajo demanda las líneas visibles de un archivo mapeado"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._file = None
+        self._mapped = None
+        self._encoding = 'utf-8'
+        self._offsets = array('Q')
+        self._classes = bytearray()
+        self._indexer = None
+        self._on_stats = None
+        self._font = QFont('Consolas')
+        self._font.setStyleHint(QFont.StyleHint.Monospace)
+        self._bold_font = QFont(self._font)
+        self._bold_font.setBold(True)
+
+    def load(self, path, on_stats=None):
+        """Abre el archivo y empieza a indexarlo en segundo plano"""
+        self.close()
+        if not path or not os.path.isfile(path):
+            return
+
+        if os.path.getsize(path) > 0:
+            self._file = open(path, 'rb')
+            self._mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            encoding = detect_encoding(self._mapped[:ENCODING_SNIFF_BYTES])
+            self._encoding = {'ascii': 'cp437', 'oem': 'cp437'}.get(encoding, encoding)
+
+        self._on_stats = on_stats
+        self._indexer = LineIndexer(path, self)
+        self._indexer.lines_indexed.connect(self._append_lines)
+        self._indexer.stats_ready.connect(self._stats_ready)
+        self._indexer.start()
+
+    def close(self):
+        """Detiene la indexación y libera el archivo mapeado"""
+        if self._indexer is not None:
+            self._indexer.requestInterruption()
+            self._indexer.wait()
+            self._indexer = None
+
+        self.beginResetModel()
+        self._offsets = array('Q')
+        self._classes = bytearray()
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.endResetModel()
+
+    def _append_lines(self, offsets, classes):
+        # Los bloques que aún llegan de un indexador anterior se descartan
+        if self.sender() is not self._indexer:
+            return
+        first = len(self._offsets)
+        self.beginInsertRows(QModelIndex(), first, first + len(offsets) - 1)
+        self._offsets.extend(offsets)
+        self._classes.extend(classes)
+        self.endInsertRows()
+
+    def _stats_ready(self, stats):
+        if self.sender() is self._indexer and self._on_stats is not None:
+            self._on_stats(stats)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._offsets)
+
+    def line_text(self, row):
+        start = self._offsets[row]
+        end = self._offsets[row + 1] if row + 1 < len(self._offsets) else len(self._mapped)
+        # Solo se decodifica lo que cabe en pantalla
+        raw = self._mapped[start:min(end, start + MAX_DISPLAY_CHARS * 4)].rstrip(b'\r\n')
+        text = raw.decode(self._encoding, errors='replace')
+        if len(text) > MAX_DISPLAY_CHARS or end - start > MAX_DISPLAY_CHARS * 4:
+            text = text[:MAX_DISPLAY_CHARS] + ' …'
+        return text.replace('\t', '    ')
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or self._mapped is None:
+            return None
+        row = index.row()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f'{row + 1:>7}  {self.line_text(row)}'
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return LINE_COLORS.get(self._classes[row])
+        if role == Qt.ItemDataRole.FontRole:
+            return self._bold_font if self._classes[row] == LINE_LABEL else self._font
+        return None
+
+
+def format_stats(stats):
+    """Texto de resumen con el tamaño y las estadísticas de líneas del script"""
+    if stats.get('error'):
+        return f"No se puede leer el archivo: {stats['error']}"
+    size = stats['size']
+    for unit in ('bytes', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            break
+        size /= 1024
+    size_text = f"{size:.0f} {unit}" if unit == 'bytes' else f"{size:.1f} {unit}"
+    if stats.get('encoding') == 'utf-16':
+        return f"{size_text} · UTF-16 (vista previa no disponible)"
+    return (
+        f"{size_text} · {stats['lines']:,} líneas · {stats['comments']:,} comentarios · "
+        f"{stats['labels']:,} etiquetas · {stats['blank']:,} en blanco · "
+        f"línea más larga: {stats['longest']:,} · codificación: {stats.get('encoding') or '-'}"
+    )
+
+
+class ScriptPreview(QWidget):
+    """Vista previa virtualizada del script: solo se leen y pintan las líneas visibles"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.model = ScriptPreviewModel(self)
+        self.view = QListView(self)
+        self.view.setUniformItemSizes(True)
+        self.view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.view.setBatchSize(LAYOUT_BATCH_SIZE)
+        self.view.setModel(self.model)
+        layout.addWidget(self.view)
+
+        self.stats_label = QLabel('Sin archivo')
+        self.stats_label.setWordWrap(True)
+        layout.addWidget(self.stats_label)
+        self.setLayout(layout)
+
+    def load(self, path):
+        self.stats_label.setText('Analizando el script...')
+        self.model.load(path, self.show_stats)
+
+    def show_stats(self, stats):
+        self.stats_label.setText(format_stats(stats))
+
+    def close_file(self):
+        self.model.close()
+        self.stats_label.setText('Sin archivo')
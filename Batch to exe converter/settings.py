@@ -0,0 +1,204 @@
+import os
+import copy
+import json
+import logging
+import threading
+
+from PyQt6.QtCore import QSettings
+
+from paths import user_data_dir
+
+logger = logging.getLogger(__name__)
+
+# Versión del formato del archivo; los archivos de versiones posteriores no se sobrescriben
+SCHEMA_VERSION = 1
+SETTINGS_FILE = 'settings.json'
+
+# Segundos que se esperan desde el último cambio antes de escribir el archivo
+SAVE_DELAY = 1.0
+
+# Almacenes anteriores que se importan la primera vez
+LEGACY_PREFERENCES = 'preferences.json'
+LEGACY_QSETTINGS = ('BatchConverter', 'Settings')
+
+# Opciones de conversión que forman un preset
+DEFAULT_OPTIONS = {
+    'console': False,
+    'center_window': False,
+    'admin_required': False,
+    'extraction_cache': False,
+    'emit_delta': False,
+    'telemetry': False,
+    'telemetry_file': '',
+    'compiler': 'auto',
+    'platforms': ['anycpu'],
+}
+
+DEFAULT_SETTINGS = {
+    'schema_version': SCHEMA_VERSION,
+    'batch_file': '',
+    'icon_file': '',
+    'output_dir': '',
+    'output_name': '',
+    'theme': 'Claro',
+    'options': DEFAULT_OPTIONS,
+    'presets': {},
+}
+
+
+class SettingsError(ValueError):
+    """Un preset no existe o su nombre no es válido"""
+
+
+def _read_legacy():
+    """Preferencias de QSettings y de preferences.json de las versiones anteriores, o None"""
+    values = {}
+    legacy = QSettings(*LEGACY_QSETTINGS)
+    for key in ('batch_file', 'icon_file', 'output_dir', 'theme'):
+        if legacy.contains(key):
+            values[key] = legacy.value(key) or ''
+
+    try:
+        with open(LEGACY_PREFERENCES, 'r') as f:
+            prefs = json.load(f)
+        values['options'] = {key: prefs[key] for key in DEFAULT_OPTIONS if key in prefs}
+        for key in ('theme', 'output_name'):
+            if key in prefs:
+                values[key] = prefs[key]
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning("No se pudo importar %s: %s", LEGACY_PREFERENCES, e)
+    return values or None
+
+
+class SettingsStore:
+    """Preferencias de la aplicación y presets con nombre en un único archivo JSON
+
+    El archivo se lee una sola vez al crear el almacén. Los cambios se aplican en
+    memoria y se escriben agrupados desde un hilo en segundo plano cuando pasan
+    SAVE_DELAY segundos sin cambios, en un temporal que se renombra con os.replace.
+    """
+
+    def __init__(self, path=None, delay=SAVE_DELAY, read_only=False):
+        self.path = path or os.path.join(user_data_dir(), SETTINGS_FILE)
+        self.delay = delay
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+        self.data = copy.deepcopy(DEFAULT_SETTINGS)
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            stored = _read_legacy()
+            if stored:
+                logger.info("Preferencias importadas de la versión anterior")
+                self._merge(stored)
+                self.schedule_save()
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("No se pudieron leer las preferencias de %s: %s", self.path, e)
+            return
+
+        if stored.get('schema_version', SCHEMA_VERSION) > SCHEMA_VERSION:
+            logger.warning("Las preferencias son de una versión posterior; no se guardarán los cambios")
+            self.read_only = True
+        self._merge(stored)
+
+    def _merge(self, stored):
+        for key, value in stored.items():
+            if key == 'options':
+                self.data['options'].update(value)
+            elif key != 'schema_version':
+                self.data[key] = value
+
+    # --- Lectura y modificación ---------------------------------------------------------
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def update(self, **values):
+        """Cambia valores de primer nivel; solo se programa una escritura si algo cambia"""
+        with self._lock:
+            changed = {key: value for key, value in values.items() if self.data.get(key) != value}
+            self.data.update(changed)
+        if changed:
+            self.schedule_save()
+
+    @property
+    def options(self):
+        return dict(self.data['options'])
+
+    def set_options(self, options):
+        self.update(options=dict(DEFAULT_OPTIONS, **options))
+
+    def preset_names(self):
+        return sorted(self.data['presets'])
+
+    def preset(self, name):
+        """Opciones de un preset completadas con los valores por defecto"""
+        if name not in self.data['presets']:
+            raise SettingsError(f"No existe el preset: {name}")
+        return dict(DEFAULT_OPTIONS, **self.data['presets'][name])
+
+    def save_preset(self, name, options):
+        name = name.strip()
+        if not name:
+            raise SettingsError("El nombre del preset no puede estar vacío")
+        options = {key: options[key] for key in DEFAULT_OPTIONS if key in options}
+        self.update(presets=dict(self.data['presets'], **{name: options}))
+
+    def delete_preset(self, name):
+        presets = dict(self.data['presets'])
+        if presets.pop(name, None) is not None:
+            self.update(presets=presets)
+
+    # --- Escritura ----------------------------------------------------------------------
+
+    def schedule_save(self):
+        """Programa la escritura; cada cambio reinicia la espera para agruparlos"""
+        if self.read_only:
+            return
+        with self._lock:
+            self._dirty = True
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self._save)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Escribe en este momento los cambios pendientes (p. ej. al cerrar la aplicación)"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self._save()
+
+    def _save(self):
+        # La instantánea se toma dentro del turno de escritura para no guardar nunca una anterior
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+                content = json.dumps(dict(self.data, schema_version=SCHEMA_VERSION), ensure_ascii=False, indent=2)
+
+            temp_path = f'{self.path}.{os.getpid()}.tmp'
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                logger.warning("No se pudieron guardar las preferencias: %s", e)
+                with self._lock:
+                    self._dirty = True
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)